@@ -1,8 +1,9 @@
 from pydantic import BaseModel
-from typing import Dict, Literal
+from typing import Dict, Literal, Optional
 
 DatabaseType = Literal["sql", "nosql"]
 DatabaseProvider = Literal["mysql", "postgresql", "supabase", "mongodb"]
+ExportFormat = Literal["csv", "ndjson", "arrow", "parquet"]
 
 class DatabaseConnection(BaseModel):
     user_id: str
@@ -10,8 +11,18 @@ class DatabaseConnection(BaseModel):
     db_provider: DatabaseProvider
     db_name: str
     credentials: Dict[str, str]
+    # Per-connection budget for agent-issued queries; server default if unset
+    query_timeout_ms: Optional[int] = None
 
 class ConnectionResponse(BaseModel):
     success: bool
     message: str
-    connection_id: str = None
\ No newline at end of file
+    connection_id: str = None
+
+class ExportRequest(BaseModel):
+    format: ExportFormat = "csv"
+    # Either a statement ({"collection", "pipeline"} JSON for MongoDB)...
+    query: Optional[str] = None
+    # ...or the query behind a tool call of a stored chat conversation
+    conversation_id: Optional[str] = None
+    tool_call_id: Optional[str] = None
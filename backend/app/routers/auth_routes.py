@@ -1,6 +1,10 @@
+import logging
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr
-from app.services.db_connect import get_supabase_client
+from app.services.db_connect import new_supabase_client
+from app.services.auth_service import token_verifier
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["auth"])
 
@@ -14,11 +18,11 @@ class UserSignup(BaseModel):
     password: str
 
 @router.post("/login")
-async def login(user_data: UserLogin):
+def login(user_data: UserLogin):
     """
     Authenticate a user using Supabase Auth.
     """
-    supabase = get_supabase_client()
+    supabase = new_supabase_client()
 
     if not supabase:
         raise HTTPException(
@@ -49,11 +53,11 @@ async def login(user_data: UserLogin):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/signup")
-async def signup(user_data: UserSignup):
+def signup(user_data: UserSignup):
     """
     Register a new user using Supabase Auth and add to custom users table.
     """
-    supabase = get_supabase_client()
+    supabase = new_supabase_client()
 
     if not supabase:
         raise HTTPException(
@@ -102,12 +106,12 @@ async def signup(user_data: UserSignup):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/signout")
-async def signout(tokens: dict):
+def signout(tokens: dict):
     """
     Sign out the current user. 
     Requires access_token and refresh_token in the body to invalidate the session on Supabase.
     """
-    supabase = get_supabase_client()
+    supabase = new_supabase_client()
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase client initialization failed")
 
@@ -119,6 +123,9 @@ async def signout(tokens: dict):
          # as the frontend has likely cleared its part.
          return {"message": "Signed out successfully (no token provided)"}
 
+    # Stop accepting the token from the verification cache right away
+    token_verifier.revoke(access_token)
+
     try:
         # To sign out a specific user from the server side using the python client,
         # we generally need to set the session for that client instance first.
@@ -133,6 +140,6 @@ async def signout(tokens: dict):
     except Exception as e:
         # Even if it fails (e.g. token expired), we effectively want the user logged out.
         # So we can log the error but still return success or a specific code.
-        print(f"Signout error: {e}")
+        logger.warning("Signout error: %s", e)
         return {"message": "Signed out locally (server session invalidation failed or not needed)"}
 
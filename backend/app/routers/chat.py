@@ -1,115 +1,422 @@
-from fastapi import APIRouter, HTTPException, Body, Header
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from typing import List, Optional, Any
+import asyncio
+import functools
+import importlib
+import logging
 import os
+import time
+import uuid
+from starlette.concurrency import run_in_threadpool
 
-from ..services.database_service import database_service
 from ..tools.database_tools import database_tools
-from ..services.db_connect import get_supabase_client
-
-# LangChain Imports
-# LangChain Imports
-from langchain_openai import ChatOpenAI
-from langchain.agents import create_agent
-# from langchain.agents import AgentExecutor, create_tool_calling_agent # Deprecated/Removed
-# from langgraph.prebuilt import create_react_agent
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-from langchain_groq import ChatGroq
+from ..services.connection_cache import connection_cache
+from ..services.db_executor import db_executor
+from ..services.auth_service import get_current_user
+from ..services.cancellation import CancelScope, current_cancel_scope
+from ..services.schema_catalog import schema_catalog
+from ..services.agent_budget import AgentBudget
+from ..services.answer_cache import answer_cache
+from ..services.conversation_store import conversation_store
+from ..services.job_queue import job_queue
+from ..services.admission import chat_limiter, current_tenant
+from .responses import ReleasingStreamingResponse
+from ..services.metrics import span, phase_seconds, tool_calls_total, chat_iterations_total, chat_requests_total
+from ..models.auth import AuthenticatedUser
+
+# LangChain is imported where it is used: it takes seconds to import and
+# would otherwise slow down every worker start. preload_langchain() imports
+# it in the background once the worker is up.
 import json
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
+logger = logging.getLogger(__name__)
+
+# Upper bound on tool calls from a single LLM turn that run at the same time
+MAX_PARALLEL_TOOL_CALLS = int(os.getenv("CHAT_MAX_PARALLEL_TOOL_CALLS", "4"))
+# How often a running chat checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = float(os.getenv("CHAT_DISCONNECT_POLL_INTERVAL", "0.5"))
+# Size of the schema summary placed in the system message
+SCHEMA_MAX_TABLES = int(os.getenv("CHAT_SCHEMA_MAX_TABLES", "15"))
+SCHEMA_MAX_CHARS = int(os.getenv("CHAT_SCHEMA_MAX_CHARS", "6000"))
+
+HISTORY_PROMPT = "Summary of earlier questions in this conversation:\n{summary}"
+
+SCHEMA_PROMPT = (
+    "You answer questions about a database using the provided tools.\n"
+    "Schema, one table per line as table(column type [PK] [-> referenced_table.column], ...), "
+    "most relevant tables first:\n"
+    "{schema}\n"
+    "Query these tables directly. Only call list_tables or get_table_schema "
+    "for tables that are not shown above."
+)
+
+# Wall-clock budget of an agent run as a background job
+JOB_DEADLINE_SECONDS = float(os.getenv("CHAT_JOB_DEADLINE_SECONDS", "900"))
+
+FINAL_ANSWER_PROMPT = (
+    "Stop calling tools: this request reached {reason}. Answer the question as well as "
+    "you can from the results above, and say so if the answer is incomplete."
+)
 
 class ChatRequest(BaseModel):
     message: str
     connection_id: str
     model_provider: str = "groq" # "openai", "gemini", or "groq"
+    # Continue an earlier conversation; a new one is started when omitted
+    conversation_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
     tool_calls: List[Any] = []
+    conversation_id: Optional[str] = None
 
-@router.post("", response_model=ChatResponse)
-async def query(request: ChatRequest, authorization: Optional[str] = Header(None)):
-    # Verify user authentication
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
-    
-    access_token = authorization.split(" ")[1]
-    
+async def _connection_provider(request: ChatRequest, user: AuthenticatedUser) -> str:
+    """Provider of the chat's connection; 404 if it does not exist or is someone else's"""
+    conn_data = await run_in_threadpool(connection_cache.get, request.connection_id)
+    if not conn_data or str(conn_data.get('user_id')) != str(user.id):
+        raise HTTPException(status_code=404, detail="Connection not found")
+    return conn_data.get('db_provider_name', conn_data['db_name'])
+
+# Modules the first chat would otherwise import
+LANGCHAIN_MODULES = ("langchain_core.messages", "langchain_core.tools", "langchain_groq")
+
+def preload_langchain():
+    """Import LangChain ahead of the first chat (blocking, run it in a background thread)"""
+    for module in LANGCHAIN_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            logger.warning("Could not preload %s: %s", module, e)
+
+def _get_llm_with_tools(connection_id: str, db_provider: str):
+    """
+    The LLM bound to the connection's tools. Blocking (it may still have to
+    import LangChain): call it through run_in_threadpool.
+    """
+    from langchain_groq import ChatGroq
+
+    tools = database_tools.get_configured_tools(connection_id, db_provider)
+
+    # Initialize LLM - Use OpenAI-compatible models with proper tool calling
     try:
-        supabase = get_supabase_client()
-        if not supabase:
-            raise HTTPException(status_code=500, detail="Failed to initialize Supabase client")
-        
-        # Verify access token
-        user_response = supabase.auth.get_user(access_token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid access token")
-            
+        if not os.getenv("GROQ_API_KEY"):
+            raise ValueError("GROQ_API_KEY is not set")
+        llm = ChatGroq(model_name="llama-3.1-8b-instant", temperature=0)
+        return llm.bind_tools(tools)
     except Exception as e:
-        raise HTTPException(status_code=401, detail="Authentication failed")
-    # print(os.getenv("GROQ_API_KEY"))
+        raise HTTPException(status_code=500, detail=f"Failed to initialize LLM: {str(e)}")
+
+def _execute_tool(connection_id: str, tool_name: str, tool_args: dict) -> Any:
+    """Run a tool call against the database (blocking)"""
+    if tool_name == 'list_tables':
+        return database_tools.list_tables(connection_id)
+    elif tool_name == 'get_table_schema':
+        return database_tools.get_table_schema(connection_id, tool_args['table_name'])
+    elif tool_name == 'execute_sql_query':
+        return database_tools.execute_sql_query(connection_id, tool_args['query'])
+    elif tool_name == 'run_aggregation':
+        return database_tools.run_aggregation(connection_id, tool_args['collection'], tool_args['pipeline'])
+    else:
+        return f"Unknown tool: {tool_name}"
+
+async def _run_tool(connection_id: str, tool_name: str, tool_args: dict) -> Any:
+    status = "error"
+    try:
+        with span(f"tool_{tool_name}"):
+            result = await db_executor.run(connection_id, _execute_tool, connection_id, tool_name, tool_args)
+        if not (isinstance(result, dict) and "error" in result):
+            status = "ok"
+        return result
+    finally:
+        tool_calls_total.inc(tool=tool_name, status=status)
+
+async def _run_tool_calls(connection_id: str, tool_calls: List[dict]):
     """
-    Process a natural language query against the connected database.
+    Run the tool calls of one LLM turn concurrently, at most
+    MAX_PARALLEL_TOOL_CALLS at a time, yielding (index, result) as each
+    completes. A failing call is reported as its result instead of
+    aborting the calls running next to it.
+    """
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_TOOL_CALLS)
+
+    async def run(index: int, tool_call: dict):
+        async with semaphore:
+            try:
+                return index, await _run_tool(connection_id, tool_call['name'], tool_call['args'])
+            except Exception as e:
+                return index, {"error": f"Tool {tool_call['name']} failed: {str(e)}"}
+
+    for next_done in asyncio.as_completed([run(i, tool_call) for i, tool_call in enumerate(tool_calls)]):
+        yield await next_done
+
+async def _open_conversation(request: ChatRequest, user: AuthenticatedUser) -> dict:
+    try:
+        return await run_in_threadpool(
+            conversation_store.open, user.id, request.connection_id, request.conversation_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+async def _save_turn(conversation: dict, request: ChatRequest, turn_messages: list, answer: str):
+    from langchain_core.messages import AIMessage
+
+    try:
+        await run_in_threadpool(
+            conversation_store.append_turn,
+            conversation["id"],
+            request.message,
+            answer,
+            turn_messages + [AIMessage(content=answer)]
+        )
+    except Exception as e:
+        logger.warning("Failed to save conversation %s: %s", conversation['id'], e)
+
+def _answer_cache_fingerprint(request: ChatRequest, conversation: dict) -> Optional[str]:
+    """Schema fingerprint for answer cache lookups, None to bypass the cache"""
+    if conversation["messages"] or conversation["summary"]:
+        # Follow-ups depend on earlier turns, the question alone is not a key
+        return None
+    return schema_catalog.fingerprint(request.connection_id)
+
+async def _initial_messages(request: ChatRequest, conversation: dict) -> list:
     """
-    # 1. Verify Connection - connection_id from frontend is source of truth
-    # 2. Get Tools
-    tools = database_tools.get_configured_tools(request.connection_id)
-    
-    # 3. Initialize LLM - Use OpenAI-compatible models with proper tool calling
+    Opening messages of a chat: a compact schema summary ranked against the
+    conversation's questions so the LLM can usually skip schema discovery,
+    the summary and recent turns of the conversation, then the question.
+    The question is always the last message.
+    """
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    messages = []
     try:
-        if os.getenv("GROQ_API_KEY"):
-            llm = ChatGroq(model_name="llama-3.1-8b-instant", temperature=0)
-           
+        summary = await db_executor.run(
+            request.connection_id,
+            schema_catalog.relevant_summary,
+            request.connection_id,
+            " ".join(conversation["questions"] + [request.message]),
+            max_tables=SCHEMA_MAX_TABLES,
+            max_chars=SCHEMA_MAX_CHARS,
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to initialize LLM: {str(e)}")
+        logger.warning("Schema summary unavailable for connection %s: %s", request.connection_id, e)
+        summary = None
+    if summary:
+        messages.append(SystemMessage(content=SCHEMA_PROMPT.format(schema=summary)))
+    if conversation["summary"]:
+        messages.append(SystemMessage(content=HISTORY_PROMPT.format(summary=conversation["summary"])))
+    messages.extend(conversation["messages"])
+    messages.append(HumanMessage(content=request.message))
+    return messages
+
+async def _replay_cached_query(request: ChatRequest, fingerprint: Optional[str]):
+    """
+    Re-run the data query cached for this question, if any, as
+    (tool_call, result). The caller adds it to the history as if the LLM had
+    issued it, so the LLM usually only has to phrase the answer.
+    """
+    cached = answer_cache.lookup(request.connection_id, fingerprint, request.message)
+    if not cached:
+        return None
+    tool_call = {"name": cached["name"], "args": cached["args"], "id": f"cached_{uuid.uuid4().hex[:12]}"}
+    try:
+        result = await _run_tool(request.connection_id, tool_call["name"], tool_call["args"])
+    except Exception as e:
+        result = {"error": str(e)}
+    if isinstance(result, dict) and "error" in result:
+        logger.info("Cached query failed, falling back to the agent: %s", result['error'])
+        answer_cache.forget(request.connection_id, tool_call)
+        return None
+    return tool_call, result
 
-    # 4. Loop until no more tool calls
+async def _final_answer(llm_with_tools, messages: list, budget: AgentBudget, reason: str) -> str:
+    """Answer from what has been gathered so far once a budget is used up"""
+    from langchain_core.messages import HumanMessage
+
+    if budget.remaining() <= 0:
+        return budget.fallback_answer(reason)
+    try:
+        response = await asyncio.wait_for(
+            llm_with_tools.bind(tool_choice="none").ainvoke(
+                messages + [HumanMessage(content=FINAL_ANSWER_PROMPT.format(reason=reason))]
+            ),
+            timeout=budget.remaining()
+        )
+    except Exception as e:
+        logger.warning("Final answer failed: %s", e)
+        return budget.fallback_answer(reason)
+    return response.content or budget.fallback_answer(reason)
+
+async def _stream_within(llm_with_tools, messages: list, budget: AgentBudget):
+    """
+    astream() of the LLM, raising asyncio.TimeoutError at the deadline. Only
+    the time spent waiting on the LLM counts towards the llm_call phase.
+    """
+    chunks = llm_with_tools.astream(messages).__aiter__()
+    waited = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(budget.remaining(), 0))
+            except StopAsyncIteration:
+                return
+            finally:
+                waited += time.perf_counter() - started
+            yield chunk
+    finally:
+        phase_seconds.observe(waited, phase="llm_call")
+        await chunks.aclose()
+
+async def _cancel_on_disconnect(http_request: Request, coro):
+    """
+    Run `coro` under a fresh cancel scope. If the client disconnects first,
+    the scope is cancelled, which aborts its in-flight database queries.
+    """
+    scope = CancelScope()
+    token = current_cancel_scope.set(scope)
     try:
-        llm_with_tools = llm.bind_tools(tools)
-        messages = [HumanMessage(content=request.message)]
+        task = asyncio.ensure_future(coro)
+    finally:
+        current_cancel_scope.reset(token)
+
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                logger.info("Client disconnected, cancelling chat request")
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            scope.cancel()
+            task.cancel()
+
+def _admit(request: ChatRequest, user: AuthenticatedUser):
+    """
+    Admission control for an interactive chat: raises AdmissionRejected
+    (HTTP 429) when the user already has too many chats running or the
+    connection's query queue is full. Pair with chat_limiter.release().
+    The chat's database work is scheduled fairly as the user's.
+    """
+    db_executor.check(request.connection_id)
+    chat_limiter.acquire(user.id)
+    current_tenant.set(str(user.id))
+
+def _release_once(user_id: str):
+    """chat_limiter.release for one admitted chat, safe to call more than once"""
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            chat_limiter.release(user_id)
+    return release
+
+@router.post("", response_model=ChatResponse)
+async def query(http_request: Request, request: ChatRequest, user: AuthenticatedUser = Depends(get_current_user)):
+    """
+    Process a natural language query against the connected database.
+    Pass the returned conversation_id back to ask follow-up questions.
+    """
+    _admit(request, user)
+    outcome = "error"
+    try:
+        # connection_id from frontend is source of truth
+        db_provider = await _connection_provider(request, user)
+        llm_with_tools = await run_in_threadpool(_get_llm_with_tools, request.connection_id, db_provider)
+        conversation = await _open_conversation(request, user)
+        with span("chat_request"):
+            response = await _cancel_on_disconnect(http_request, _run_agent(llm_with_tools, request, conversation))
+        outcome = "answered"
+        return response
+    except HTTPException as e:
+        outcome = "cancelled" if e.status_code == 499 else "error"
+        raise
+    finally:
+        chat_limiter.release(user.id)
+        chat_requests_total.inc(endpoint="chat", outcome=outcome)
+
+async def _run_agent(llm_with_tools, request: ChatRequest, conversation: dict,
+                     budget: Optional[AgentBudget] = None, progress=None) -> ChatResponse:
+    """
+    The agent loop behind the chat endpoint. `progress`, if given, is
+    awaited with a description of each step and the share of the step
+    budget used so far.
+    """
+    from langchain_core.messages import AIMessage, ToolMessage
+
+    # Loop until no more tool calls
+    try:
+        messages = await _initial_messages(request, conversation)
+        turn_start = len(messages) - 1
         all_tool_calls = []
-        iteration = 0
+        budget = budget or AgentBudget()
+        fingerprint = _answer_cache_fingerprint(request, conversation)
+        
+        logger.debug("Starting chat loop for query: %s", request.message)
         
-        print(f"DEBUG: Starting chat loop for query: {request.message}")
+        replay = await _replay_cached_query(request, fingerprint)
+        if replay:
+            tool_call, result = replay
+            logger.debug("Replaying cached %s(%s)", tool_call['name'], tool_call['args'])
+            messages.append(AIMessage(content="", tool_calls=[tool_call]))
+            messages.append(ToolMessage(content=database_tools.format_result(result), tool_call_id=tool_call['id']))
+            all_tool_calls.append({'name': tool_call['name'], 'args': tool_call['args'], 'result': result})
         
         while True:
-            iteration += 1
-            print(f"DEBUG: Iteration {iteration} - Calling LLM")
+            stopped = budget.exceeded()
+            if stopped:
+                logger.info("Stopping agent at %s, asking for a final answer", stopped)
+                answer = await _final_answer(llm_with_tools, messages, budget, stopped)
+                break
             
-            response = llm_with_tools.invoke(messages)
+            budget.compact(messages)
+            logger.debug("Iteration %d - Calling LLM", budget.iterations + 1)
+            if progress:
+                await progress(f"Calling the LLM (step {budget.iterations + 1})",
+                               budget.iterations / budget.max_iterations)
+            
+            chat_iterations_total.inc(endpoint="chat")
+            try:
+                with span("llm_call"):
+                    response = await asyncio.wait_for(llm_with_tools.ainvoke(messages), timeout=budget.remaining())
+            except asyncio.TimeoutError:
+                stopped = budget.exceeded() or "the time limit"
+                logger.info("LLM call hit %s", stopped)
+                answer = budget.fallback_answer(stopped)
+                break
+            budget.record(messages, response)
             
             if not response.tool_calls:
-                print(f"DEBUG: No tool calls in response, returning final answer")
-                print(f"DEBUG: Final response: {response.content[:100]}...")
-                return ChatResponse(
-                    response=response.content,
-                    tool_calls=all_tool_calls
-                )
+                logger.debug("No tool calls in response, returning final answer: %.100s", response.content)
+                answer_cache.remember(request.connection_id, fingerprint, request.message, all_tool_calls)
+                answer = response.content
+                break
             
-            print(f"DEBUG: Found {len(response.tool_calls)} tool calls")
+            logger.debug("Found %d tool calls", len(response.tool_calls))
             
-            # Execute tool calls
+            # Execute tool calls concurrently, results keep the original order
             messages.append(response)
+            if progress:
+                await progress(f"Running {', '.join(tool_call['name'] for tool_call in response.tool_calls)}",
+                               budget.iterations / budget.max_iterations)
+            
+            results = [None] * len(response.tool_calls)
+            async for i, result in _run_tool_calls(request.connection_id, response.tool_calls):
+                tool_call = response.tool_calls[i]
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Tool %d/%d %s(%s) result: %.200s", i + 1, len(response.tool_calls),
+                                 tool_call['name'], tool_call['args'], result)
+                results[i] = result
             
-            for i, tool_call in enumerate(response.tool_calls):
+            for tool_call, result in zip(response.tool_calls, results):
                 tool_name = tool_call['name']
                 tool_args = tool_call['args']
                 
-                print(f"DEBUG: Executing tool {i+1}/{len(response.tool_calls)}: {tool_name}({tool_args})")
-                
-                # Execute the tool
-                if tool_name == 'list_tables':
-                    result = database_tools.list_tables(request.connection_id)
-                elif tool_name == 'get_table_schema':
-                    result = database_tools.get_table_schema(request.connection_id, tool_args['table_name'])
-                elif tool_name == 'execute_sql_query':
-                    result = database_tools.execute_sql_query(request.connection_id, tool_args['query'])
-                else:
-                    result = f"Unknown tool: {tool_name}"
-                
-                print(f"DEBUG: Tool result: {str(result)[:200]}...")
-                
                 all_tool_calls.append({
                     'name': tool_name,
                     'args': tool_args,
@@ -117,9 +424,159 @@ async def query(request: ChatRequest, authorization: Optional[str] = Header(None
                 })
                 
                 # Add tool result to conversation
-                messages.append(ToolMessage(content=str(result), tool_call_id=tool_call['id']))
+                messages.append(ToolMessage(content=database_tools.format_result(result), tool_call_id=tool_call['id']))
+        
+        await _save_turn(conversation, request, messages[turn_start:], answer)
+        return ChatResponse(
+            response=answer,
+            tool_calls=all_tool_calls,
+            conversation_id=conversation["id"]
+        )
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Agent execution failed: {str(e)}")
\ No newline at end of file
+        logger.exception("Agent execution failed")
+        raise HTTPException(status_code=500, detail=f"Agent execution failed: {str(e)}")
+
+@router.post("/jobs", status_code=202)
+async def query_job(request: ChatRequest, user: AuthenticatedUser = Depends(get_current_user)):
+    """
+    Run a chat as a background job, for questions that need heavy queries.
+    Returns the job at once; follow it under /api/jobs/{job_id}, its result
+    is the ChatResponse as JSON. The job counts towards the user's chats
+    in flight until it is over.
+    """
+    _admit(request, user)
+    try:
+        db_provider = await _connection_provider(request, user)
+        llm_with_tools = await run_in_threadpool(_get_llm_with_tools, request.connection_id, db_provider)
+        conversation = await _open_conversation(request, user)
+    except BaseException:
+        chat_limiter.release(user.id)
+        raise
+
+    async def run(job):
+        await job.report("Reading the schema", 0.0)
+        budget = AgentBudget(deadline_seconds=JOB_DEADLINE_SECONDS)
+        response = await _run_agent(llm_with_tools, request, conversation, budget=budget, progress=job.report)
+        path = job.spool("json", "application/json")
+        await run_in_threadpool(_write_file, path, response.model_dump_json())
+
+    return await job_queue.submit(
+        user.id, request.connection_id, "chat", run, on_finish=functools.partial(chat_limiter.release, user.id)
+    )
+
+def _write_file(path: str, content: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+def _event(event_type: str, **data) -> str:
+    return json.dumps({"type": event_type, **data}, default=str) + "\n"
+
+@router.post("/stream")
+async def query_stream(request: ChatRequest, user: AuthenticatedUser = Depends(get_current_user)):
+    """
+    Streaming variant of the chat endpoint. Emits newline-delimited JSON events:
+    `token` for LLM output, `tool_call` when a tool starts, `tool_result` when it
+    completes, and a closing `final` (or `error`) event carrying the
+    conversation_id for follow-ups. When a budget stops the agent early,
+    `final` carries the reason as `stopped`. Closing the stream cancels the
+    database queries still running for it.
+    """
+    _admit(request, user)
+    release = _release_once(user.id)
+    try:
+        db_provider = await _connection_provider(request, user)
+        llm_with_tools = await run_in_threadpool(_get_llm_with_tools, request.connection_id, db_provider)
+        conversation = await _open_conversation(request, user)
+    except BaseException:
+        release()
+        raise
+
+    async def events():
+        from langchain_core.messages import AIMessage, ToolMessage
+
+        scope = CancelScope()
+        current_cancel_scope.set(scope)
+        started = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            messages = await _initial_messages(request, conversation)
+            turn_start = len(messages) - 1
+            all_tool_calls = []
+            budget = AgentBudget()
+            fingerprint = _answer_cache_fingerprint(request, conversation)
+
+            replay = await _replay_cached_query(request, fingerprint)
+            if replay:
+                tool_call, result = replay
+                yield _event("tool_call", id=tool_call['id'], name=tool_call['name'], args=tool_call['args'])
+                yield _event("tool_result", id=tool_call['id'], name=tool_call['name'], result=result)
+                messages.append(AIMessage(content="", tool_calls=[tool_call]))
+                messages.append(ToolMessage(content=database_tools.format_result(result), tool_call_id=tool_call['id']))
+                all_tool_calls.append({'name': tool_call['name'], 'args': tool_call['args'], 'result': result})
+
+            while True:
+                stopped = budget.exceeded()
+                if stopped:
+                    answer = await _final_answer(llm_with_tools, messages, budget, stopped)
+                    break
+
+                budget.compact(messages)
+                chat_iterations_total.inc(endpoint="stream")
+                response = None
+                try:
+                    async for chunk in _stream_within(llm_with_tools, messages, budget):
+                        response = chunk if response is None else response + chunk
+                        if chunk.content:
+                            yield _event("token", content=chunk.content)
+                except asyncio.TimeoutError:
+                    stopped = budget.exceeded() or "the time limit"
+                    answer = budget.fallback_answer(stopped)
+                    break
+                budget.record(messages, response)
+
+                if response is None or not response.tool_calls:
+                    answer = response.content if response is not None else ""
+                    if response is not None:
+                        answer_cache.remember(request.connection_id, fingerprint, request.message, all_tool_calls)
+                    break
+
+                messages.append(response)
+
+                for tool_call in response.tool_calls:
+                    yield _event("tool_call", id=tool_call['id'], name=tool_call['name'], args=tool_call['args'])
+
+                results = [None] * len(response.tool_calls)
+                async for i, result in _run_tool_calls(request.connection_id, response.tool_calls):
+                    tool_call = response.tool_calls[i]
+                    yield _event("tool_result", id=tool_call['id'], name=tool_call['name'], result=result)
+                    results[i] = result
+
+                for tool_call, result in zip(response.tool_calls, results):
+                    tool_name = tool_call['name']
+                    tool_args = tool_call['args']
+                    all_tool_calls.append({
+                        'name': tool_name,
+                        'args': tool_args,
+                        'result': result
+                    })
+                    messages.append(ToolMessage(content=database_tools.format_result(result), tool_call_id=tool_call['id']))
+
+            await _save_turn(conversation, request, messages[turn_start:], answer)
+            final = {"response": answer, "tool_calls": all_tool_calls, "conversation_id": conversation["id"]}
+            if stopped:
+                final["stopped"] = stopped
+            outcome = "answered"
+            yield _event("final", **final)
+
+        except Exception as e:
+            outcome = "error"
+            logger.exception("Agent execution failed")
+            yield _event("error", detail=f"Agent execution failed: {str(e)}")
+        finally:
+            scope.cancel()
+            release()
+            phase_seconds.observe(time.perf_counter() - started, phase="chat_stream")
+            chat_requests_total.inc(endpoint="stream", outcome=outcome)
+
+    return ReleasingStreamingResponse(events(), release, media_type="application/x-ndjson")
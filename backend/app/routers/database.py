@@ -1,11 +1,29 @@
-from fastapi import APIRouter, HTTPException, Header
-from ..models.database import DatabaseConnection, ConnectionResponse
+import json
+import time
+from fastapi import APIRouter, HTTPException, Depends
+from starlette.concurrency import run_in_threadpool
+from ..models.database import DatabaseConnection, ConnectionResponse, ExportRequest
+from ..models.auth import AuthenticatedUser
 from ..services.database_service import database_service
 from ..services.db_connect import get_supabase_client
+from ..services.warmup import warmup_manager
+from ..services.query_cache import query_cache
+from ..services.answer_cache import answer_cache
+from ..services.connection_cache import connection_cache
+from ..services.conversation_store import conversation_store
+from ..services.query_executors import get_executor
+from ..services.result_export import ResultExport, create_writer
+from ..services.job_queue import job_queue
+from ..services.admission import AdmissionRejected, current_tenant
+from ..services.auth_service import get_current_user
+from .responses import ReleasingStreamingResponse
 from typing import Optional
 
 router = APIRouter(prefix="/api/database", tags=["database"])
 
+# How often an export job reports its progress, in rows
+EXPORT_PROGRESS_ROWS = 100000
+
 @router.post("/create_connection", response_model=ConnectionResponse)
 async def create_connection(connection: DatabaseConnection):
     if not connection.user_id:
@@ -29,47 +47,155 @@ async def connect_database(connection_id: str):
     return result
 
 @router.get("/connections")
-async def get_connections(authorization: Optional[str] = Header(None)):
+def get_connections(user: AuthenticatedUser = Depends(get_current_user)):
     """Get all connections for the authenticated user"""
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
-    
-    access_token = authorization.split(" ")[1]
-    
     try:
         supabase = get_supabase_client()
         if not supabase:
             raise HTTPException(status_code=500, detail="Failed to initialize Supabase client")
         
-        # Get user from access token
-        user_response = supabase.auth.get_user(access_token)
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid access token")
-        
-        user_id = user_response.user.id
-        
         # Get connections for the user
-        result = supabase.table("connections").select("*").eq("user_id", user_id).execute()
+        result = supabase.table("connections").select("*").eq("user_id", user.id).execute()
         
         return {"connections": result.data}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get connections: {str(e)}")
 
-@router.get("/status/{connection_id}")
-async def check_connection_status(connection_id: str):
-    """Check if a connection is still active"""
-    if not await database_service.check_connection(connection_id):
+async def _owned_connection(connection_id: str, user: AuthenticatedUser) -> dict:
+    """The user's connection record; 404 if it does not exist or is someone else's"""
+    conn_data = await run_in_threadpool(connection_cache.get, connection_id)
+    if not conn_data or str(conn_data.get('user_id')) != str(user.id):
         raise HTTPException(status_code=404, detail="Connection not found")
-    
-    return {"status": "active", "connection_id": connection_id}
+    return conn_data
+
+@router.get("/status/{connection_id}")
+async def check_connection_status(connection_id: str, user: AuthenticatedUser = Depends(get_current_user)):
+    """
+    Check if one of the user's connections is still active and report schema
+    warm-up progress. Warm-up progress is tracked by the worker that ran it,
+    other workers report it as unknown.
+    """
+    await _owned_connection(connection_id, user)
+
+    return {
+        "status": "active",
+        "connection_id": connection_id,
+        "warmup": warmup_manager.status(connection_id) or {"state": "unknown"}
+    }
 
 @router.post("/disconnect")
-async def disconnect_database():
-    """Disconnect from a database"""
-    result = await database_service.disconnect_database()
+async def disconnect_database(connection_id: Optional[str] = None, user: AuthenticatedUser = Depends(get_current_user)):
+    """Disconnect the user from one connection, or from all of them when none is given"""
+    result = await database_service.disconnect_database(user.id, connection_id)
     
     if not result.success:
         raise HTTPException(status_code=400, detail=result.message)
     
-    return result
\ No newline at end of file
+    return result
+
+@router.get("/query-cache/stats")
+async def get_query_cache_stats(user: AuthenticatedUser = Depends(get_current_user)):
+    """Hit/miss counters of the SQL result cache"""
+    return query_cache.stats()
+
+@router.post("/query-cache/invalidate/{connection_id}")
+async def invalidate_query_cache(connection_id: str, user: AuthenticatedUser = Depends(get_current_user)):
+    """Drop cached query results for one of the user's connections"""
+    await _owned_connection(connection_id, user)
+    removed = query_cache.invalidate(connection_id)
+    return {"success": True, "connection_id": connection_id, "removed": removed}
+
+@router.get("/answer-cache/stats")
+async def get_answer_cache_stats(user: AuthenticatedUser = Depends(get_current_user)):
+    """Hit/miss counters of the question-to-query cache"""
+    return answer_cache.stats()
+
+@router.post("/answer-cache/invalidate/{connection_id}")
+async def invalidate_answer_cache(connection_id: str, user: AuthenticatedUser = Depends(get_current_user)):
+    """Forget the cached queries behind answered questions for one of the user's connections"""
+    await _owned_connection(connection_id, user)
+    removed = answer_cache.invalidate(connection_id)
+    return {"success": True, "connection_id": connection_id, "removed": removed}
+
+async def _export_query(connection_id: str, request: ExportRequest, user: AuthenticatedUser) -> str:
+    """The statement to export: given directly, or taken from a chat tool call"""
+    if request.query:
+        return request.query
+    if not (request.conversation_id and request.tool_call_id):
+        raise HTTPException(status_code=400, detail="Provide a query, or a conversation_id and tool_call_id")
+
+    tool_call = await run_in_threadpool(
+        conversation_store.find_tool_call, user.id, connection_id, request.conversation_id, request.tool_call_id
+    )
+    if tool_call is None:
+        raise HTTPException(status_code=404, detail=f"Tool call {request.tool_call_id} not found")
+    if tool_call["name"] == "execute_sql_query":
+        return tool_call["args"]["query"]
+    if tool_call["name"] == "run_aggregation":
+        pipeline = tool_call["args"]["pipeline"]
+        if isinstance(pipeline, str):
+            pipeline = json.loads(pipeline)
+        return json.dumps({"collection": tool_call["args"]["collection"], "pipeline": pipeline})
+    raise HTTPException(status_code=400, detail=f"Tool call {request.tool_call_id} did not query data")
+
+async def _prepare_export(connection_id: str, request: ExportRequest, user: AuthenticatedUser) -> ResultExport:
+    current_tenant.set(str(user.id))
+    conn_data = await _owned_connection(connection_id, user)
+    executor = get_executor(conn_data.get('db_provider_name', conn_data['db_name']))
+    if executor is None:
+        raise HTTPException(status_code=400, detail="Export is not supported for this provider")
+
+    query = await _export_query(connection_id, request, user)
+    try:
+        writer = create_writer(request.format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ResultExport(executor, connection_id, conn_data['credentials'], query, writer)
+
+@router.post("/{connection_id}/export")
+async def export_query_result(connection_id: str, request: ExportRequest, user: AuthenticatedUser = Depends(get_current_user)):
+    """
+    Stream the full result of a query as CSV, NDJSON, Arrow or Parquet,
+    without the row limits of chat tool results
+    """
+    export = await _prepare_export(connection_id, request, user)
+    try:
+        await export.start()
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Export failed: {str(e)}")
+
+    filename = f"export-{connection_id}-{time.strftime('%Y%m%d-%H%M%S')}.{export.writer.extension}"
+    return ReleasingStreamingResponse(
+        export.body(),
+        export.close,
+        media_type=export.writer.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/{connection_id}/export/jobs", status_code=202)
+async def export_query_result_job(connection_id: str, request: ExportRequest, user: AuthenticatedUser = Depends(get_current_user)):
+    """
+    Export a query result as a background job. Returns the job at once;
+    follow it under /api/jobs/{job_id} and download the file from there.
+    """
+    export = await _prepare_export(connection_id, request, user)
+
+    async def run(job):
+        try:
+            await job.report("Running the query")
+            await export.start()
+            path = job.spool(export.writer.extension, export.writer.media_type)
+            rows = 0
+            with open(path, "wb") as f:
+                async for chunk in export.body():
+                    await run_in_threadpool(f.write, chunk)
+                    if export.rows > rows + EXPORT_PROGRESS_ROWS:
+                        rows = export.rows
+                        await job.report(f"Exported {rows} rows")
+        finally:
+            export.close()
+
+    return await job_queue.submit(user.id, connection_id, "export", run)
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from ..models.auth import AuthenticatedUser
+from ..services.auth_service import get_current_user
+from ..services.job_queue import job_queue, TERMINAL_STATES
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+# How often /events checks a job for changes
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+
+async def _get_job(user: AuthenticatedUser, job_id: str) -> dict:
+    job = await run_in_threadpool(job_queue.get, user.id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("")
+async def list_jobs(user: AuthenticatedUser = Depends(get_current_user)):
+    """The authenticated user's recent jobs, newest first"""
+    return {"jobs": await run_in_threadpool(job_queue.list_jobs, user.id)}
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, user: AuthenticatedUser = Depends(get_current_user)):
+    """Status, current step and progress (0-1, when known) of a job"""
+    return await _get_job(user, job_id)
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, user: AuthenticatedUser = Depends(get_current_user)):
+    """
+    Newline-delimited JSON stream of the job's status, one line per change,
+    closed once the job has finished
+    """
+    job = await _get_job(user, job_id)
+
+    async def events():
+        nonlocal job
+        last = None
+        while True:
+            if job != last:
+                yield json.dumps(job) + "\n"
+                last = job
+            if job["status"] in TERMINAL_STATES:
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            job = await run_in_threadpool(job_queue.get, user.id, job_id)
+            if job is None:
+                return
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str, user: AuthenticatedUser = Depends(get_current_user)):
+    """Download the spooled result of a succeeded job"""
+    job = await _get_job(user, job_id)
+    result = await run_in_threadpool(job_queue.result, user.id, job_id)
+    if result is None:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, no result available")
+    return FileResponse(result["path"], media_type=result["media_type"], filename=os.path.basename(result["path"]))
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str, user: AuthenticatedUser = Depends(get_current_user)):
+    """Cancel a queued or running job"""
+    job = await _get_job(user, job_id)
+    if not await job_queue.cancel(user.id, job_id):
+        raise HTTPException(status_code=409, detail=f"Job is already {job['status']}")
+    return {"success": True, "job_id": job_id}
@@ -0,0 +1,20 @@
+from fastapi.responses import StreamingResponse
+
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that calls `release` once the response is over, however
+    it ends: the body generator's own cleanup never runs if the client is gone
+    before the first chunk is sent, and background tasks are skipped when
+    sending fails. `release` must be safe to call more than once.
+    """
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
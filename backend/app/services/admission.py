@@ -0,0 +1,196 @@
+import asyncio
+import contextvars
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+from app.services.metrics import admission_rejections_total, phase_seconds, queue_depth
+
+
+class AdmissionRejected(Exception):
+    """A request turned away because a limit or queue is full; maps to HTTP 429"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Who the current request's database work is accounted to (the user), for
+# fair scheduling. The database executor falls back to the connection.
+current_tenant: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_tenant", default=None)
+
+# Whether the current database work belongs to a background job, which the
+# database executor keeps to a share of its pool.
+background_work: contextvars.ContextVar[bool] = contextvars.ContextVar("background_work", default=False)
+
+
+class _HoldTimer:
+    """Moving average of how long a slot is held, to suggest a Retry-After"""
+
+    def __init__(self, initial: float):
+        self.average = initial
+
+    def observe(self, seconds: float):
+        self.average = 0.8 * self.average + 0.2 * seconds
+
+    def retry_after(self, waiting: int, slots: int) -> int:
+        return max(1, math.ceil(self.average * (waiting + 1) / max(slots, 1)))
+
+
+class InFlightLimiter:
+    """
+    At most `limit` in-flight requests per key (e.g. chats per user).
+    Requests over the limit are rejected at once rather than queued.
+    Not thread-safe: use from the event loop only.
+    """
+
+    def __init__(self, name: str, limit: int, typical_seconds: float = 10):
+        self.name = name
+        self.limit = limit
+        self._in_flight: Dict[str, list] = {}
+        self._timer = _HoldTimer(typical_seconds)
+
+    def in_flight(self, key: str) -> int:
+        return len(self._in_flight.get(str(key), ()))
+
+    def acquire(self, key: str):
+        """Take a slot for `key`; raises AdmissionRejected. Pair with release()."""
+        key = str(key)
+        started = self._in_flight.setdefault(key, [])
+        if len(started) >= self.limit:
+            admission_rejections_total.inc(limit=self.name)
+            raise AdmissionRejected(
+                f"Too many requests in flight (limit {self.limit}), try again shortly",
+                self._timer.retry_after(0, self.limit),
+            )
+        started.append(time.monotonic())
+
+    def release(self, key: str):
+        key = str(key)
+        started = self._in_flight.get(key)
+        if not started:
+            return
+        self._timer.observe(time.monotonic() - started.pop(0))
+        if not started:
+            del self._in_flight[key]
+
+
+class FairScheduler:
+    """
+    Admission for database work. Grants at most `capacity` slots in total and
+    `per_key_limit` per key (connection). Waiters queue per tenant and are
+    served round-robin across tenants, so one busy tenant cannot starve the
+    others. A key that already has `max_queued` waiters rejects new work at
+    once with a Retry-After estimate instead of growing its queue.
+    Not thread-safe: use from the event loop only.
+    """
+
+    def __init__(self, capacity: int, per_key_limit: int, max_queued: int, name: str = "database"):
+        self.name = name
+        self.capacity = capacity
+        self.per_key_limit = per_key_limit
+        self.max_queued = max_queued
+        self._active_total = 0
+        self._active: Dict[str, int] = {}
+        self._queued: Dict[str, int] = {}
+        # tenant -> its waiters (key, future), tenants in round-robin order
+        self._waiters = OrderedDict()
+        self._timer = _HoldTimer(0.5)
+
+    def queued(self, key: str) -> int:
+        return self._queued.get(str(key), 0)
+
+    def check(self, key: str):
+        """Raise AdmissionRejected if new work for `key` would be rejected"""
+        key = str(key)
+        waiting = self._queued.get(key, 0)
+        if waiting >= self.max_queued:
+            admission_rejections_total.inc(limit="connection_queue")
+            raise AdmissionRejected(
+                f"Too many queries queued for this connection ({waiting}), try again shortly",
+                self._timer.retry_after(waiting, self.per_key_limit),
+            )
+
+    async def acquire(self, key: str, tenant: Optional[str] = None):
+        """Wait for a slot for `key`. Pair with release()."""
+        key = str(key)
+        self.check(key)
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(str(tenant or key), deque())
+        waiters.append((key, future))
+        self._queued[key] = self._queued.get(key, 0) + 1
+        self._dispatch()
+        if future.done():
+            return
+
+        enqueued = time.perf_counter()
+        queue_depth.inc(1, queue=self.name)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the waiter went away
+                self.release(key)
+            else:
+                self._withdraw(tenant or key, key, future)
+            raise
+        finally:
+            queue_depth.inc(-1, queue=self.name)
+            phase_seconds.observe(time.perf_counter() - enqueued, phase="db_queue_wait")
+
+    def release(self, key: str, held_seconds: Optional[float] = None):
+        key = str(key)
+        if held_seconds is not None:
+            self._timer.observe(held_seconds)
+        self._active_total -= 1
+        self._active[key] -= 1
+        if not self._active[key]:
+            del self._active[key]
+        self._dispatch()
+
+    def _withdraw(self, tenant: str, key: str, future: asyncio.Future):
+        waiters = self._waiters.get(str(tenant))
+        if waiters is None:
+            return
+        try:
+            waiters.remove((key, future))
+        except ValueError:
+            return
+        self._queued[key] -= 1
+        if not self._queued[key]:
+            del self._queued[key]
+        if not waiters:
+            del self._waiters[str(tenant)]
+
+    def _dispatch(self):
+        """Grant free slots, one waiter per tenant in turn"""
+        while self._active_total < self.capacity:
+            entry = self._next_waiter()
+            if entry is None:
+                return
+            key, future = entry
+            self._active_total += 1
+            self._active[key] = self._active.get(key, 0) + 1
+            future.set_result(None)
+
+    def _next_waiter(self) -> Optional[Tuple[str, asyncio.Future]]:
+        """Take the oldest runnable waiter of the first tenant that has one"""
+        for tenant, waiters in list(self._waiters.items()):
+            for key, future in list(waiters):
+                if future.done():
+                    # Cancelled before its task could withdraw it
+                    self._withdraw(tenant, key, future)
+                elif self._active.get(key, 0) < self.per_key_limit:
+                    self._withdraw(tenant, key, future)
+                    if tenant in self._waiters:
+                        self._waiters.move_to_end(tenant)
+                    return key, future
+        return None
+
+
+chat_limiter = InFlightLimiter(
+    "user_chats",
+    int(os.getenv("CHAT_MAX_IN_FLIGHT_PER_USER", "3")),
+    typical_seconds=float(os.getenv("CHAT_TYPICAL_SECONDS", "10")),
+)
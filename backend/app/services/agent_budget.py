@@ -0,0 +1,88 @@
+import os
+import time
+from typing import Any, List, Optional
+
+# Defaults for the limits of a single chat request
+MAX_ITERATIONS = int(os.getenv("CHAT_MAX_ITERATIONS", "8"))
+MAX_PROMPT_TOKENS = int(os.getenv("CHAT_MAX_PROMPT_TOKENS", "60000"))
+DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "90"))
+# Tool results from earlier turns are cut to this many characters
+COMPACT_TOOL_CHARS = int(os.getenv("CHAT_COMPACT_TOOL_CHARS", "1500"))
+
+
+def estimate_tokens(messages: List[Any]) -> int:
+    """Rough prompt size (~4 characters per token) for models that report no usage"""
+    size = 0
+    for message in messages:
+        size += len(str(message.content))
+        size += len(str(getattr(message, "tool_calls", None) or ""))
+    return size // 4
+
+
+class AgentBudget:
+    """
+    Limits of one agent loop: LLM iterations, cumulative prompt tokens and
+    a wall-clock deadline. Also compacts the tool results of earlier turns
+    so the history resent on every iteration stays small.
+    """
+
+    def __init__(self, max_iterations: int = MAX_ITERATIONS, max_prompt_tokens: int = MAX_PROMPT_TOKENS,
+                 deadline_seconds: float = DEADLINE_SECONDS, compact_tool_chars: int = COMPACT_TOOL_CHARS):
+        self.max_iterations = max_iterations
+        self.max_prompt_tokens = max_prompt_tokens
+        self.deadline_seconds = deadline_seconds
+        self.compact_tool_chars = compact_tool_chars
+        self.started_at = time.monotonic()
+        self.iterations = 0
+        self.prompt_tokens = 0
+        # Messages before this index have already been compacted
+        self._compacted = 0
+
+    def remaining(self) -> float:
+        """Seconds left until the deadline"""
+        return self.deadline_seconds - (time.monotonic() - self.started_at)
+
+    def record(self, messages: List[Any], response: Any):
+        """Account for one LLM call on `messages`"""
+        self.iterations += 1
+        usage = getattr(response, "usage_metadata", None) or {}
+        self.prompt_tokens += usage.get("input_tokens") or estimate_tokens(messages)
+
+    def exceeded(self) -> Optional[str]:
+        """Which budget is used up, or None if the loop may call the LLM again"""
+        if self.iterations >= self.max_iterations:
+            return f"the limit of {self.max_iterations} steps"
+        if self.prompt_tokens >= self.max_prompt_tokens:
+            return f"the budget of {self.max_prompt_tokens} prompt tokens"
+        if self.remaining() <= 0:
+            return f"the time limit of {self.deadline_seconds:g} seconds"
+        return None
+
+    def compact(self, messages: List[Any]):
+        """
+        Cut long tool results of every turn but the latest one in place. The
+        LLM has already read them, a prefix keeps enough for follow-ups.
+        """
+        from langchain_core.messages import ToolMessage
+
+        latest_turn = max(
+            (i for i, message in enumerate(messages) if getattr(message, "tool_calls", None)),
+            default=0
+        )
+        for i in range(self._compacted, latest_turn):
+            message = messages[i]
+            if isinstance(message, ToolMessage) and len(str(message.content)) > self.compact_tool_chars:
+                content = str(message.content)
+                messages[i] = ToolMessage(
+                    content=f"{content[:self.compact_tool_chars]}... "
+                            f"[{len(content) - self.compact_tool_chars} characters of an earlier result omitted]",
+                    tool_call_id=message.tool_call_id,
+                )
+        self._compacted = max(self._compacted, latest_turn)
+
+    @staticmethod
+    def fallback_answer(reason: str) -> str:
+        return (
+            f"I could not finish answering within {reason}. "
+            "The queries that did run are listed with their results; try a more specific question."
+        )
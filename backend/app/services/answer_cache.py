@@ -0,0 +1,150 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from app.services.query_cache import normalize_sql, is_read_only
+from app.services.metrics import record_cache
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Words that do not change which query answers a question. Every other
+# word (entities, periods, negations, comparisons) and every number must
+# match for a cached query to be reused.
+FILLER_WORDS = {
+    "a", "an", "the", "please", "me", "us", "show", "give", "tell", "list", "find",
+    "get", "what", "whats", "which", "is", "are", "was", "were", "be", "can", "could",
+    "would", "you", "i", "we", "my", "our", "do", "does", "did", "there", "of", "and",
+}
+
+# Tool calls that fetch data and can be replayed for a repeated question
+DATA_TOOLS = {"execute_sql_query", "run_aggregation"}
+
+
+def question_terms(question: str) -> Tuple[frozenset, Tuple[str, ...]]:
+    """(crudely singularized words, numbers in order) of a question"""
+    words = set()
+    numbers = []
+    for token in _TOKEN.findall(question.lower()):
+        if token.isdigit():
+            numbers.append(token)
+            continue
+        if token in FILLER_WORDS:
+            continue
+        if token.endswith("ies") and len(token) > 4:
+            token = token[:-3] + "y"
+        elif token.endswith("s") and not token.endswith("ss") and len(token) > 3:
+            token = token[:-1]
+        words.add(token)
+    return frozenset(words), tuple(numbers)
+
+
+class AnswerCache:
+    """
+    TTL + LRU map from a normalized question to the data query the agent
+    converged on for it, per connection and schema fingerprint.
+
+    Lookups only forgive case, punctuation, word order, plurals and filler
+    words: any other word that differs ("germany" vs "france", "year" vs
+    "month", "not") could change the rows asked for, so it is a miss. An
+    entry recorded against another schema fingerprint is dropped on lookup.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (connection_id, words, numbers) -> entry
+        self._entries: "OrderedDict[Tuple[str, frozenset, Tuple[str, ...]], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, connection_id: str, fingerprint: Optional[str], question: str) -> Optional[Dict[str, Any]]:
+        """The cached {"name", "args"} tool call for a question, if any"""
+        if not fingerprint:
+            return None
+        words, numbers = question_terms(question)
+        key = (str(connection_id), words, numbers)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (entry["expires_at"] <= time.monotonic() or entry["fingerprint"] != fingerprint):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                record_cache("answer", False)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            record_cache("answer", True)
+            return {"name": entry["name"], "args": entry["args"]}
+
+    def remember(self, connection_id: str, fingerprint: Optional[str], question: str, tool_calls: List[Dict[str, Any]]):
+        """
+        Record the data query behind a final answer. Only answers resting
+        on exactly one successful read-only data query are cached.
+        """
+        if not fingerprint:
+            return
+        data_calls = [
+            call for call in tool_calls
+            if call["name"] in DATA_TOOLS
+            and not (isinstance(call["result"], dict) and "error" in call["result"])
+        ]
+        if len(data_calls) != 1:
+            return
+        call = data_calls[0]
+        if call["name"] == "execute_sql_query" and not is_read_only(normalize_sql(call["args"].get("query", ""))):
+            return
+
+        words, numbers = question_terms(question)
+        key = (str(connection_id), words, numbers)
+        with self._lock:
+            self._entries[key] = {
+                "name": call["name"],
+                "args": call["args"],
+                "fingerprint": fingerprint,
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, connection_id: str, tool_call: Dict[str, Any]):
+        """Drop the entries replaying a tool call that no longer works"""
+        with self._lock:
+            keys = [
+                key for key, entry in self._entries.items()
+                if key[0] == str(connection_id)
+                and entry["name"] == tool_call["name"] and entry["args"] == tool_call["args"]
+            ]
+            for key in keys:
+                del self._entries[key]
+
+    def invalidate(self, connection_id: Optional[str]) -> int:
+        if not connection_id:
+            return 0
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == str(connection_id)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+)
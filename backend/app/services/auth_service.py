@@ -0,0 +1,229 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Header, HTTPException
+from starlette.concurrency import run_in_threadpool
+from app.models.auth import AuthenticatedUser
+from app.services.db_connect import get_supabase_client
+from app.services.metrics import record_cache, span
+from app.services.session_registry import session_registry
+
+# Optional import for local JWT verification
+try:
+    import jwt
+except ImportError:
+    jwt = None
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidTokenError(Exception):
+    pass
+
+
+class TokenVerifier:
+    """
+    Verifies Supabase access tokens, locally when possible.
+
+    Tokens signed with the project's JWT secret (HS256) or a key from the
+    project's JWKS are checked in-process. Anything else falls back to a
+    remote `auth.get_user` call. Verified tokens are cached for a short
+    time (never past their expiry) so repeat requests skip verification.
+    Revoked (signed-out) tokens are rejected until they expire; revocations
+    are shared with the other workers through the session registry, whose
+    cached entries for the token lapse within `cache_ttl`.
+    """
+
+    # How long to reject a revoked token whose expiry cannot be read, in seconds
+    REVOKED_DEFAULT_TTL = 3600
+
+    def __init__(
+        self,
+        jwt_secret: Optional[str] = None,
+        jwks_url: Optional[str] = None,
+        cache_ttl: float = 60,
+        max_entries: int = 1024,
+    ):
+        self.jwt_secret = jwt_secret
+        self.jwks_url = jwks_url
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        self._jwks_client = None
+        # token hash -> (expires at, user)
+        self._cache = OrderedDict()
+        # token hash -> expires at, for tokens revoked by this worker
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _token_key(access_token: str) -> str:
+        return hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+    def cached(self, access_token: str) -> Optional[AuthenticatedUser]:
+        """Return the user for an already verified, unexpired token."""
+        key = self._token_key(access_token)
+        with self._lock:
+            entry = self._cache.get(key)
+            if not entry:
+                return None
+            if entry[0] <= time.time():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[1]
+
+    def verify(self, access_token: str) -> AuthenticatedUser:
+        """
+        Verify a token and return its user. Blocking: may fetch the JWKS or
+        call the Supabase auth server. Raises InvalidTokenError.
+        """
+        user = self.cached(access_token)
+        if user:
+            return user
+        if self._is_revoked(access_token):
+            raise InvalidTokenError("Access token has been revoked")
+
+        claims = self._verify_locally(access_token)
+        if claims is not None:
+            user = AuthenticatedUser(id=claims["sub"], email=claims.get("email"))
+            expires_at = min(float(claims["exp"]), time.time() + self.cache_ttl)
+        else:
+            user = self._verify_remotely(access_token)
+            expires_at = time.time() + self.cache_ttl
+            exp = self._unverified_expiry(access_token)
+            if exp:
+                expires_at = min(exp, expires_at)
+
+        self._remember(access_token, user, expires_at)
+        return user
+
+    def revoke(self, access_token: str):
+        """Reject a token from now until it expires, e.g. after sign out."""
+        key = self._token_key(access_token)
+        now = time.time()
+        expires_at = self._unverified_expiry(access_token) or now + self.REVOKED_DEFAULT_TTL
+        with self._lock:
+            self._cache.pop(key, None)
+            self._revoked = {k: v for k, v in self._revoked.items() if v > now}
+            self._revoked[key] = expires_at
+        session_registry.revoke_token(key, expires_at)
+
+    def _is_revoked(self, access_token: str) -> bool:
+        key = self._token_key(access_token)
+        with self._lock:
+            expires_at = self._revoked.get(key)
+        if expires_at is not None and expires_at > time.time():
+            return True
+        return session_registry.is_token_revoked(key)
+
+    @staticmethod
+    def _unverified_expiry(access_token: str) -> Optional[float]:
+        """The token's `exp` claim without checking the signature, if readable"""
+        if jwt is None:
+            return None
+        try:
+            exp = jwt.decode(access_token, options={"verify_signature": False}).get("exp")
+        except jwt.PyJWTError:
+            return None
+        return float(exp) if exp else None
+
+    def _remember(self, access_token: str, user: AuthenticatedUser, expires_at: float):
+        key = self._token_key(access_token)
+        with self._lock:
+            self._cache[key] = (expires_at, user)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _verify_locally(self, access_token: str) -> Optional[dict]:
+        """
+        Return verified claims, or None if the token cannot be checked
+        locally and the remote call should decide.
+        """
+        if jwt is None:
+            return None
+
+        try:
+            algorithm = jwt.get_unverified_header(access_token).get("alg")
+        except jwt.PyJWTError:
+            raise InvalidTokenError("Malformed access token")
+
+        if algorithm == "HS256" and self.jwt_secret:
+            key = self.jwt_secret
+        elif algorithm in ("RS256", "ES256") and self.jwks_url:
+            try:
+                if self._jwks_client is None:
+                    self._jwks_client = jwt.PyJWKClient(self.jwks_url, cache_keys=True)
+                key = self._jwks_client.get_signing_key_from_jwt(access_token).key
+            except jwt.PyJWTError as e:
+                logger.warning("JWKS lookup failed, falling back to remote verification: %s", e)
+                return None
+        else:
+            return None
+
+        try:
+            return jwt.decode(
+                access_token,
+                key,
+                algorithms=[algorithm],
+                audience="authenticated",
+                options={"require": ["exp", "sub"]}
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidTokenError(str(e))
+
+    def _verify_remotely(self, access_token: str) -> AuthenticatedUser:
+        supabase = get_supabase_client()
+        if not supabase:
+            raise RuntimeError("Failed to initialize Supabase client")
+
+        try:
+            user_response = supabase.auth.get_user(access_token)
+        except Exception as e:
+            raise InvalidTokenError(str(e))
+        if not user_response or not user_response.user:
+            raise InvalidTokenError("Invalid access token")
+
+        return AuthenticatedUser(id=user_response.user.id, email=user_response.user.email)
+
+
+def _default_jwks_url() -> Optional[str]:
+    if os.getenv("SUPABASE_JWKS_URL"):
+        return os.getenv("SUPABASE_JWKS_URL")
+    if os.getenv("SUPABASE_URL"):
+        return f"{os.getenv('SUPABASE_URL').rstrip('/')}/auth/v1/.well-known/jwks.json"
+    return None
+
+
+token_verifier = TokenVerifier(
+    jwt_secret=os.getenv("SUPABASE_JWT_SECRET"),
+    jwks_url=_default_jwks_url(),
+    cache_ttl=float(os.getenv("AUTH_TOKEN_CACHE_TTL", "60")),
+)
+
+
+async def get_current_user(authorization: Optional[str] = Header(None)) -> AuthenticatedUser:
+    """FastAPI dependency resolving the bearer token to the authenticated user"""
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
+
+    access_token = authorization.split(" ")[1]
+
+    user = token_verifier.cached(access_token)
+    record_cache("token", user is not None)
+    if user:
+        return user
+
+    try:
+        with span("auth_verify"):
+            return await run_in_threadpool(token_verifier.verify, access_token)
+    except InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid access token")
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception:
+        raise HTTPException(status_code=401, detail="Authentication failed")
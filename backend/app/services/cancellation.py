@@ -0,0 +1,77 @@
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCancelledError(Exception):
+    pass
+
+
+class CancelScope:
+    """
+    Cancellation handle for the database work of one HTTP request.
+
+    Executors register a driver-level cancel callback for each statement
+    while it runs; cancelling the scope (e.g. when the client disconnects)
+    invokes them so the database stops working on queries nobody will read.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._callbacks = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning("Failed to cancel query: %s", e)
+
+    def check(self):
+        if self.cancelled:
+            raise QueryCancelledError("Query cancelled by client")
+
+    @contextmanager
+    def registered(self, callback: Callable[[], None]):
+        """Keep `callback` registered while the wrapped statement runs"""
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelledError("Query cancelled by client")
+            token = self._next_token
+            self._next_token += 1
+            self._callbacks[token] = callback
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._callbacks.pop(token, None)
+
+
+# Scope of the request currently being served. The database executor copies
+# the context into its worker threads, so executors can see it.
+current_cancel_scope: contextvars.ContextVar[Optional[CancelScope]] = contextvars.ContextVar(
+    "current_cancel_scope", default=None
+)
+
+
+@contextmanager
+def cancellable(callback: Callable[[], None]):
+    """Register `callback` on the current request's scope, if there is one"""
+    scope = current_cancel_scope.get()
+    if scope is None:
+        yield
+        return
+    with scope.registered(callback):
+        yield
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from app.services.db_connect import get_supabase_client
+from app.services.metrics import record_cache, span
+
+
+class ConnectionCache:
+    """
+    TTL + LRU cache of rows from the Supabase `connections` table.
+
+    Shared by DatabaseService and DatabaseTools so agent tool calls do not
+    need a metadata round trip each time they resolve credentials.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # connection_id -> (expires at, connection record)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, connection_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the connection record, loading it from Supabase on a miss.
+        Returns None if the connection does not exist.
+        """
+        connection_id = str(connection_id)
+        with self._lock:
+            entry = self._entries.get(connection_id)
+            if entry:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(connection_id)
+                    record_cache("connection", True)
+                    return entry[1]
+                del self._entries[connection_id]
+
+        record_cache("connection", False)
+        with span("connection_lookup"):
+            record = self._fetch(connection_id)
+        if record is not None:
+            self.put(connection_id, record)
+        return record
+
+    def put(self, connection_id: str, record: Dict[str, Any]):
+        with self._lock:
+            self._entries[str(connection_id)] = (time.monotonic() + self.ttl, record)
+            self._entries.move_to_end(str(connection_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, connection_id: Optional[str]):
+        if not connection_id:
+            return
+        with self._lock:
+            self._entries.pop(str(connection_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _fetch(self, connection_id: str) -> Optional[Dict[str, Any]]:
+        supabase = get_supabase_client()
+        if not supabase:
+            raise ValueError("Failed to initialize Supabase client")
+
+        result = supabase.table("connections").select("*").eq("id", connection_id).execute()
+        if not result.data:
+            return None
+        return result.data[0]
+
+
+connection_cache = ConnectionCache(
+    max_entries=int(os.getenv("CONNECTION_CACHE_MAX_ENTRIES", "256")),
+    ttl=float(os.getenv("CONNECTION_CACHE_TTL", "300")),
+)
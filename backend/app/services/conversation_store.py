@@ -0,0 +1,198 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+
+
+class ConversationStore:
+    """
+    Server-side chat history, so follow-up questions reuse the schema,
+    queries and results of earlier turns instead of rediscovering them.
+
+    The last `keep_turns` turns are replayed verbatim (message and tool
+    history); older turns are folded into a short running summary that is
+    extended one turn at a time, without an LLM call. State lives in a local
+    SQLite database shared by every worker on the host.
+    """
+
+    def __init__(self, path: str, keep_turns: int = 3, ttl: float = 7 * 24 * 3600,
+                 summary_max_chars: int = 4000):
+        self.path = path
+        self.keep_turns = keep_turns
+        self.ttl = ttl
+        self.summary_max_chars = summary_max_chars
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            self._local.connection = connection
+            self._ensure_schema(connection)
+        return connection
+
+    def _ensure_schema(self, connection: sqlite3.Connection):
+        with self._init_lock:
+            if self._initialized:
+                return
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    connection_id TEXT NOT NULL,
+                    summary TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS turns (
+                    conversation_id TEXT NOT NULL,
+                    turn INTEGER NOT NULL,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    messages TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (conversation_id, turn)
+                )
+            """)
+            self._initialized = True
+
+    def open(self, user_id: str, connection_id: str, conversation_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Load a conversation as {"id", "summary", "questions", "messages"}, or
+        start a new one when `conversation_id` is None. Raises ValueError if
+        it does not exist for this user and connection.
+        """
+        connection = self._connection()
+        if conversation_id is None:
+            now = time.time()
+            conversation_id = uuid.uuid4().hex
+            connection.execute(
+                "INSERT INTO conversations (id, user_id, connection_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, str(user_id), str(connection_id), now, now)
+            )
+            return {"id": conversation_id, "summary": "", "questions": [], "messages": []}
+
+        row = connection.execute(
+            "SELECT summary FROM conversations WHERE id = ? AND user_id = ? AND connection_id = ?",
+            (conversation_id, str(user_id), str(connection_id))
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"Conversation {conversation_id} not found")
+
+        from langchain_core.messages import messages_from_dict
+
+        turns = connection.execute(
+            "SELECT question, messages FROM turns WHERE conversation_id = ? ORDER BY turn DESC LIMIT ?",
+            (conversation_id, self.keep_turns)
+        ).fetchall()
+        turns.reverse()
+        messages = []
+        for _, serialized in turns:
+            messages.extend(messages_from_dict(json.loads(serialized)))
+        return {
+            "id": conversation_id,
+            "summary": row[0],
+            "questions": [question for question, _ in turns],
+            "messages": messages,
+        }
+
+    def find_tool_call(self, user_id: str, connection_id: str, conversation_id: str,
+                       tool_call_id: str) -> Optional[Dict[str, Any]]:
+        """
+        {"name", "args", "id"} of a tool call made in one of the conversation's
+        stored turns, or None. Turns already folded into the summary no
+        longer have their tool calls.
+        """
+        connection = self._connection()
+        rows = connection.execute(
+            "SELECT t.messages FROM turns t JOIN conversations c ON c.id = t.conversation_id "
+            "WHERE c.id = ? AND c.user_id = ? AND c.connection_id = ? ORDER BY t.turn DESC",
+            (conversation_id, str(user_id), str(connection_id))
+        ).fetchall()
+        for (serialized,) in rows:
+            for message in json.loads(serialized):
+                for tool_call in message.get("data", {}).get("tool_calls") or []:
+                    if tool_call.get("id") == tool_call_id:
+                        return tool_call
+        return None
+
+    def append_turn(self, conversation_id: str, question: str, answer: str, messages: List[Any]):
+        """
+        Store one question/answer turn with its messages, and fold the turn
+        that falls out of the verbatim window into the summary.
+        """
+        from langchain_core.messages import messages_to_dict
+
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            turn = connection.execute(
+                "SELECT COALESCE(MAX(turn), 0) + 1 FROM turns WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()[0]
+            connection.execute(
+                "INSERT INTO turns (conversation_id, turn, question, answer, messages, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (conversation_id, turn, question, answer,
+                 json.dumps(messages_to_dict(messages), default=str), now)
+            )
+            summary = connection.execute(
+                "SELECT summary FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()[0]
+
+            expired = connection.execute(
+                "SELECT question, answer, messages FROM turns WHERE conversation_id = ? AND turn <= ?",
+                (conversation_id, turn - self.keep_turns)
+            ).fetchall()
+            for old_question, old_answer, old_messages in expired:
+                summary = self._extend_summary(summary, old_question, old_answer, json.loads(old_messages))
+            connection.execute(
+                "DELETE FROM turns WHERE conversation_id = ? AND turn <= ?",
+                (conversation_id, turn - self.keep_turns)
+            )
+            connection.execute(
+                "UPDATE conversations SET summary = ?, updated_at = ? WHERE id = ?",
+                (summary, now, conversation_id)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def purge_expired(self) -> int:
+        """Delete conversations idle for longer than the TTL. Run periodically (see main.py)."""
+        connection = self._connection()
+        cutoff = time.time() - self.ttl
+        connection.execute("DELETE FROM turns WHERE conversation_id IN "
+                           "(SELECT id FROM conversations WHERE updated_at < ?)", (cutoff,))
+        return connection.execute("DELETE FROM conversations WHERE updated_at < ?", (cutoff,)).rowcount
+
+    def _extend_summary(self, summary: str, question: str, answer: str, messages: List[Dict[str, Any]]) -> str:
+        queries = []
+        for message in messages:
+            for tool_call in message.get("data", {}).get("tool_calls") or []:
+                if tool_call["name"] in ("execute_sql_query", "run_aggregation"):
+                    queries.append(json.dumps(tool_call["args"], default=str))
+        line = f"- Q: {question} | A: {answer[:300]}"
+        if queries:
+            line += f" | queries: {'; '.join(queries)[:500]}"
+        summary = f"{summary}\n{line}".strip()
+        # Keep the most recent part when the summary outgrows its budget
+        return summary[-self.summary_max_chars:]
+
+
+conversation_store = ConversationStore(
+    os.getenv("CONVERSATION_STORE_PATH") or os.path.join(tempfile.gettempdir(), "db_copilot_conversations.sqlite3"),
+    keep_turns=int(os.getenv("CONVERSATION_KEEP_TURNS", "3")),
+    ttl=float(os.getenv("CONVERSATION_TTL", str(7 * 24 * 3600))),
+)
@@ -0,0 +1,95 @@
+import logging
+import os
+from typing import Dict, Any, Optional, Tuple
+from app.services.query_cache import normalize_sql, is_read_only
+from app.services.query_executors import MAX_RESULT_ROWS
+
+logger = logging.getLogger(__name__)
+
+
+class CostGuard:
+    """
+    Pre-flight check of agent-issued SQL against the planner's estimates.
+
+    Modes:
+    - "off": statements run as written
+    - "reject": statements whose plan is over a threshold are not run; the
+      reason goes back to the LLM as the tool result so it can rewrite them
+    - "limit": read-only statements over a threshold are first retried
+      wrapped in a LIMIT, and only rejected if still too expensive
+    """
+
+    MODES = ("off", "reject", "limit")
+
+    def __init__(self, mode: str = "off", max_rows: int = 1_000_000, max_cost: float = 10_000_000,
+                 max_scan_rows: int = 1_000_000):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown cost guard mode {mode!r}, expected one of {self.MODES}")
+        self.mode = mode
+        self.max_rows = max_rows
+        self.max_cost = max_cost
+        self.max_scan_rows = max_scan_rows
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def review(self, plan: Dict[str, Any], limited: bool = False) -> Optional[str]:
+        """Why a plan is too expensive, or None if it is acceptable"""
+        if plan["cost"] is not None and plan["cost"] > self.max_cost:
+            return f"estimated cost {plan['cost']:,.0f} exceeds {self.max_cost:,.0f}"
+        if plan["rows"] > self.max_rows:
+            return f"estimated {plan['rows']:,} result rows exceeds {self.max_rows:,}"
+        if not limited:
+            # Under a LIMIT a full scan stops early, which the cost reflects
+            for scan in plan["full_scans"]:
+                if scan["rows"] > self.max_scan_rows:
+                    return f"full scan of {scan['table']} (~{scan['rows']:,} rows)"
+        return None
+
+    @staticmethod
+    def with_limit(query: str, limit: int) -> Optional[str]:
+        """`query` wrapped in a LIMIT, or None if it is not a plain read"""
+        normalized = normalize_sql(query)
+        if not is_read_only(normalized) or not normalized.startswith(("select", "with")):
+            return None
+        statement = query.strip().rstrip(';')
+        return f"SELECT * FROM ({statement}) AS limited LIMIT {int(limit)}"
+
+    def check(self, executor, connection_id: str, credentials: Dict[str, str],
+              query: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Returns (statement to run, None), or (query, rejection) where the
+        rejection is an error result for the LLM. Statements that cannot be
+        explained are let through.
+        """
+        plan = executor.explain(connection_id, credentials, query)
+        if plan is None:
+            return query, None
+        reason = self.review(plan)
+        if reason is None:
+            return query, None
+
+        if self.mode == "limit":
+            limited = self.with_limit(query, MAX_RESULT_ROWS + 1)
+            if limited:
+                limited_plan = executor.explain(connection_id, credentials, limited)
+                if limited_plan is not None and self.review(limited_plan, limited=True) is None:
+                    logger.debug("Cost guard added a LIMIT (%s): %.200s", reason, query)
+                    return limited, None
+
+        logger.info("Cost guard rejected query (%s): %.200s", reason, query)
+        return query, {
+            "error": f"Query rejected before execution: {reason}",
+            "estimated_rows": plan["rows"],
+            "hint": "Rewrite the query to be cheaper: filter on indexed columns, "
+                    "aggregate in SQL, or add a LIMIT.",
+        }
+
+
+cost_guard = CostGuard(
+    mode=os.getenv("QUERY_COST_GUARD", "off"),
+    max_rows=int(os.getenv("QUERY_COST_GUARD_MAX_ROWS", "1000000")),
+    max_cost=float(os.getenv("QUERY_COST_GUARD_MAX_COST", "10000000")),
+    max_scan_rows=int(os.getenv("QUERY_COST_GUARD_MAX_SCAN_ROWS", "1000000")),
+)
@@ -1,58 +1,59 @@
-import uuid
-from typing import Dict, Any
+import importlib
+import inspect
+from typing import Dict, Any, Optional
+from starlette.concurrency import run_in_threadpool
 from ..models.database import DatabaseConnection, ConnectionResponse
-from app.services.db_connect import get_supabase_client
+from app.services.db_connect import get_supabase_client, get_async_supabase_client
+from app.services.engine_registry import engine_registry
+from app.services.connection_cache import connection_cache
+from app.services.schema_catalog import schema_catalog
+from app.services.warmup import warmup_manager
+from app.services.db_executor import db_executor
+from app.services.query_cache import query_cache
+from app.services.answer_cache import answer_cache
+from app.services.session_registry import session_registry
+from app.services.query_executors import get_executor
 
 
-# Optional imports for database drivers
-try:
-    import mysql.connector
-except ImportError:
-    mysql = None
-
-try:
-    import psycopg2
-except ImportError:
-    psycopg2 = None
-
-try:
-    import pymongo
-except ImportError:
-    pymongo = None
-
-try:
-    from supabase import create_client, Client
-except ImportError:
-    create_client = None
+def _optional_driver(module_name: str):
+    """
+    Database driver module, imported on first use so a worker only loads the
+    drivers of the providers it serves. None if it is not installed.
+    """
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        return None
 
 class DatabaseService:
     def __init__(self):
-        self.active_connection: str|None = None 
+        # Active sessions are tracked per user in a store shared by all workers
+        self.sessions = session_registry
 
     async def check_connection(self, connection_id: str) -> str:
         # if connection_id in self.connections:
         #     return True
 
-        supabase = get_supabase_client()
-        
-        if not supabase:
+        try:
+            conn_data = await run_in_threadpool(connection_cache.get, connection_id)
+        except ValueError:
             return ""
         
-        result = supabase.table("connections").select("*").eq("id", connection_id).execute()
-        
-        if result.data:
-            return result.data[0]['id']
+        if conn_data:
+            return conn_data['id']
         else:
             return ""
         
     async def get_connections(self, user_id: str) -> list[ConnectionResponse]:
-        supabase = get_supabase_client()
+        supabase = await self._metadata_client()
         
         if not supabase:
             return []
         
         # Fetch connections for the user
-        result = supabase.table("connections").select("*").eq("user_id", user_id).execute()
+        result = await self._execute(
+            supabase.table("connections").select("*").eq("user_id", user_id)
+        )
         
         if result.data:
             # self.connections = {
@@ -76,19 +77,12 @@ class DatabaseService:
     async def create_connection(self, connection: DatabaseConnection) -> ConnectionResponse:
         try:
             # First, verify the connection actually works
-            if connection.db_provider == "mysql":
-                result = await self._connect_mysql(connection.credentials)
-            elif connection.db_provider == "postgresql":
-                result = await self._connect_postgresql(connection.credentials)
-            elif connection.db_provider == "supabase":
-                result = await self._connect_supabase(connection.credentials)
-            elif connection.db_provider == "mongodb":
-                result = await self._connect_mongodb(connection.credentials)
-            else:
+            result = await self._test_connection(connection.db_provider, connection.credentials)
+            if result is None:
                 return ConnectionResponse(success=False, message="Unsupported database provider")
             
             if result["success"]:
-                supabase = get_supabase_client()
+                supabase = await self._metadata_client()
                 if not supabase:
                     return ConnectionResponse(success=False, message="Failed to initialize backend Supabase client")
 
@@ -99,11 +93,16 @@ class DatabaseService:
                     "credentials": connection.credentials,
                     "connected": False
                 }
+                if connection.query_timeout_ms:
+                    connection_data["query_timeout_ms"] = connection.query_timeout_ms
                 
-                insert_result = supabase.table("connections").insert(connection_data).execute()
+                insert_result = await self._execute(
+                    supabase.table("connections").insert(connection_data)
+                )
                 
                 if insert_result.data:
                     new_id = str(insert_result.data[0]['id'])
+                    connection_cache.invalidate(new_id)
                     return await self.connect_database(new_id)
                 else:
                     return ConnectionResponse(success=False, message="Failed to save connection to database")
@@ -113,39 +112,38 @@ class DatabaseService:
         except Exception as e:
             return ConnectionResponse(success=False, message=f"Connection failed: {str(e)}")
     
-    async def connect_database(self, connection_id: str) -> ConnectionResponse:
+    async def connect_database(self, connection_id: str, user_id: str = None) -> ConnectionResponse:
         try:
-            supabase = get_supabase_client()
+            supabase = await self._metadata_client()
             if not supabase:
                 return ConnectionResponse(success=False, message="Failed to initialize backend Supabase client")
             
-            # Get connection details
-            result = supabase.table("connections").select("*").eq("id", connection_id).execute()
-            if not result.data:
+            # Get fresh connection details, the record may have been edited
+            connection_cache.invalidate(connection_id)
+            query_cache.invalidate(connection_id)
+            conn_data = await run_in_threadpool(connection_cache.get, connection_id)
+            if not conn_data:
                 return ConnectionResponse(success=False, message="Connection not found")
             
-            conn_data = result.data[0]
             credentials = conn_data['credentials']
             db_provider = conn_data.get('db_provider_name', conn_data['db_name'])
             
             # Test the connection
-            if db_provider == "mysql":
-                test_result = await self._connect_mysql(credentials)
-            elif db_provider == "postgresql":
-                test_result = await self._connect_postgresql(credentials)
-            elif db_provider == "supabase":
-                test_result = await self._connect_supabase(credentials)
-            elif db_provider == "mongodb":
-                test_result = await self._connect_mongodb(credentials)
-            else:
+            test_result = await self._test_connection(db_provider, credentials, connection_id)
+            if test_result is None:
                 return ConnectionResponse(success=False, message="Unsupported database provider")
             
             if test_result["success"]:
                 # Update connected status and set active connection
-                update_result = supabase.table("connections").update({"connected": True}).eq("id", connection_id).execute()
+                update_result = await self._execute(
+                    supabase.table("connections").update({"connected": True}).eq("id", connection_id)
+                )
                 
                 if update_result.data:
-                    self.active_connection = connection_id
+                    connection_cache.put(connection_id, update_result.data[0])
+                    # Sessions belong to the connection's owner unless told otherwise
+                    await run_in_threadpool(self.sessions.activate, user_id or conn_data['user_id'], connection_id)
+                    warmup_manager.start(connection_id)
                     return ConnectionResponse(success=True, message="Connected successfully", connection_id=connection_id)
                 else:
                     return ConnectionResponse(success=False, message="Failed to update connection status")
@@ -155,24 +153,87 @@ class DatabaseService:
         except Exception as e:
             return ConnectionResponse(success=False, message=f"Connection failed: {str(e)}")
     
-    async def disconnect_database(self):
-        if not self.active_connection:
+    async def disconnect_database(self, user_id: str, connection_id: str = None) -> ConnectionResponse:
+        """
+        Disconnect one of the user's active connections, or all of them when
+        no connection_id is given.
+        """
+        active = await run_in_threadpool(self.sessions.active_connections, user_id)
+        targets = [connection_id] if connection_id in active else ([] if connection_id else active)
+        if not targets:
             return ConnectionResponse(success=False, message="No active connection to disconnect")
         
-        supabase = get_supabase_client()
+        supabase = await self._metadata_client()
         if not supabase:
             return ConnectionResponse(success=False, message="Failed to initialize backend Supabase client")
         
-        update_result = supabase.table("connections").update({"connected": False}).eq("id", self.active_connection).execute()
+        for target in targets:
+            await run_in_threadpool(self.sessions.deactivate, user_id, target)
+            if await run_in_threadpool(self.sessions.is_active, target):
+                # Another session still uses this connection
+                continue
+
+            update_result = await self._execute(
+                supabase.table("connections").update({"connected": False}).eq("id", target)
+            )
+            if not update_result.data:
+                return ConnectionResponse(success=False, message="Failed to disconnect from database")
+            # Disposing the engine closes its pooled connections, which may block
+            await run_in_threadpool(self._release, target)
         
-        if update_result.data:
-            self.active_connection = None
-            return ConnectionResponse(success=True, message="Disconnected successfully")
-        else:
-            return ConnectionResponse(success=False, message="Failed to disconnect from database")
+        return ConnectionResponse(success=True, message="Disconnected successfully")
+
+    def _release(self, connection_id: str):
+        """Free this worker's pooled handle and cached state for a connection"""
+        engine_registry.dispose(connection_id)
+        connection_cache.invalidate(connection_id)
+        schema_catalog.invalidate(connection_id)
+        warmup_manager.forget(connection_id)
+        query_cache.invalidate(connection_id)
+        answer_cache.invalidate(connection_id)
+
+    async def _metadata_client(self):
+        """Shared Supabase client for the connections table, async when available"""
+        client = await get_async_supabase_client()
+        if client is None:
+            client = await run_in_threadpool(get_supabase_client)
+        return client
+
+    async def _execute(self, query) -> Any:
+        """Execute a query built on either client without blocking the event loop"""
+        if inspect.iscoroutinefunction(query.execute):
+            return await query.execute()
+        return await run_in_threadpool(query.execute)
+
+    async def _test_connection(self, db_provider: str, credentials: Dict[str, str], connection_id: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Test credentials with the provider's blocking driver on the database
+        executor. Returns None for unsupported providers.
+
+        Saved connections are tested through their pooled handle so the
+        connection stays warm for the first query.
+        """
+        executor = get_executor(db_provider)
+        if connection_id and executor is not None:
+            try:
+                await db_executor.run(connection_id, executor.ping, connection_id, credentials)
+                return {"success": True}
+            except Exception as e:
+                return {"success": False, "error": f"{db_provider} connection failed: {str(e)}"}
+
+        if db_provider == "mysql":
+            return await db_executor.run(connection_id, self._connect_mysql, credentials)
+        elif db_provider == "postgresql":
+            return await db_executor.run(connection_id, self._connect_postgresql, credentials)
+        elif db_provider == "supabase":
+            return await db_executor.run(connection_id, self._connect_supabase, credentials)
+        elif db_provider == "mongodb":
+            return await db_executor.run(connection_id, self._connect_mongodb, credentials)
+        return None
 
-    async def _connect_mysql(self, credentials: Dict[str, str]) -> Dict[str, Any]:
-        if mysql is None:
+    def _connect_mysql(self, credentials: Dict[str, str]) -> Dict[str, Any]:
+        pymysql = _optional_driver("pymysql")
+        if pymysql is None:
             return {"success": False, "error": "MySQL driver not installed"}
             
         required_fields = ["host", "port", "username", "password", "database"]
@@ -180,7 +241,7 @@ class DatabaseService:
             return {"success": False, "error": "Missing required credentials"}
         
         try:
-            connection = mysql.connector.connect(
+            connection = pymysql.connect(
                 host=credentials["host"],
                 port=int(credentials["port"]),
                 user=credentials["username"],
@@ -192,7 +253,8 @@ class DatabaseService:
         except Exception as e:
             return {"success": False, "error": f"MySQL connection failed: {str(e)}"}
     
-    async def _connect_postgresql(self, credentials: Dict[str, str]) -> Dict[str, Any]:
+    def _connect_postgresql(self, credentials: Dict[str, str]) -> Dict[str, Any]:
+        psycopg2 = _optional_driver("psycopg2")
         if psycopg2 is None:
             return {"success": False, "error": "PostgreSQL driver not installed"}
             
@@ -215,7 +277,7 @@ class DatabaseService:
         except Exception as e:
             return {"success": False, "error": f"PostgreSQL connection failed: {str(e)}"}
     
-    async def _connect_supabase(self, credentials: Dict[str, str]) -> Dict[str, Any]:
+    def _connect_supabase(self, credentials: Dict[str, str]) -> Dict[str, Any]:
         if "connection_string" not in credentials:
             return {"success": False, "error": "Missing connection string"}
         
@@ -236,7 +298,8 @@ class DatabaseService:
         except Exception as e:
             return {"success": False, "error": f"Supabase connection failed: {str(e)}"}
     
-    async def _connect_mongodb(self, credentials: Dict[str, str]) -> Dict[str, Any]:
+    def _connect_mongodb(self, credentials: Dict[str, str]) -> Dict[str, Any]:
+        pymongo = _optional_driver("pymongo")
         if pymongo is None:
             return {"success": False, "error": "MongoDB driver not installed"}
             
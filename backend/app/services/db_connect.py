@@ -1,25 +1,120 @@
+import asyncio
+import logging
 import os
-from supabase import create_client, Client
+import threading
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv()
 
-def get_supabase_client() -> Client:
-    """
-    Creates and returns a Supabase client using environment variables.
-    Returns None if credentials are missing.
-    """
+_client: "Client" = None
+_client_lock = threading.Lock()
+_async_client = None
+_async_client_lock = None
+
+
+def _credentials():
     supabase_url = os.getenv("SUPABASE_URL")
     supabase_key = os.getenv("SUPABASE_ANON_KEY")
 
     if not supabase_url or not supabase_key:
-        print("Error: Supabase credentials not found in environment variables.")
+        logger.error("Supabase credentials not found in environment variables")
+        return None
+    return supabase_url, supabase_key
+
+
+def _supabase():
+    """The supabase package, imported on first use as it is slow to import"""
+    import supabase
+    return supabase
+
+
+def _stateless_options(options_class):
+    # The shared client never holds a user session, so there is nothing to
+    # persist or refresh
+    return options_class(persist_session=False, auto_refresh_token=False)
+
+
+def get_supabase_client() -> "Client":
+    """
+    Returns the process-wide Supabase client, creating it on first use.
+    The client keeps its HTTP connection pool alive across requests.
+    Returns None if credentials are missing.
+
+    The shared client must stay session-free: never call sign_in, sign_up,
+    set_session or sign_out on it, use new_supabase_client() for those.
+    Passing a token explicitly (e.g. auth.get_user(token)) is safe.
+    """
+    global _client
+    if _client is not None:
+        return _client
+
+    with _client_lock:
+        if _client is None:
+            credentials = _credentials()
+            if not credentials:
+                return None
+            try:
+                supabase = _supabase()
+                _client = supabase.create_client(*credentials, options=_stateless_options(supabase.ClientOptions))
+            except Exception as e:
+                logger.error("Error connecting to Supabase: %s", e)
+                return None
+    return _client
+
+
+def new_supabase_client() -> "Client":
+    """
+    Creates a fresh, isolated Supabase client for per-request auth flows
+    (login, signup, signout) whose session must not leak to other users.
+    Returns None if credentials are missing.
+    """
+    credentials = _credentials()
+    if not credentials:
         return None
 
     try:
-        client = create_client(supabase_url, supabase_key)
-        return client
+        supabase = _supabase()
+        return supabase.create_client(*credentials, options=_stateless_options(supabase.ClientOptions))
     except Exception as e:
-        print(f"Error connecting to Supabase: {e}")
+        logger.error("Error connecting to Supabase: %s", e)
         return None
+
+
+async def get_async_supabase_client():
+    """
+    Async counterpart of get_supabase_client(), shared by the process.
+    Returns None if credentials are missing or the installed supabase
+    package has no async client.
+    """
+    global _async_client, _async_client_lock
+    if _async_client is not None:
+        return _async_client
+    # Importing supabase is slow, keep it off the event loop. The async
+    # client is only available in newer supabase releases
+    acreate_client = getattr(await asyncio.to_thread(_supabase), "acreate_client", None)
+    if acreate_client is None:
+        return None
+
+    if _async_client_lock is None:
+        _async_client_lock = asyncio.Lock()
+    async with _async_client_lock:
+        if _async_client is None:
+            credentials = _credentials()
+            if not credentials:
+                return None
+            try:
+                from supabase import AsyncClientOptions
+                _async_client = await acreate_client(
+                    *credentials, options=_stateless_options(AsyncClientOptions)
+                )
+            except Exception as e:
+                logger.error("Error connecting to Supabase: %s", e)
+                return None
+    return _async_client
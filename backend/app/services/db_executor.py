@@ -0,0 +1,108 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from app.services.admission import FairScheduler, background_work, current_tenant
+
+
+class DatabaseExecutor:
+    """
+    Runs blocking database driver calls on a bounded thread pool so they never
+    block the event loop. Calls for the same connection are additionally capped
+    so one chat cannot monopolize the pool or the customer's database. Queued
+    calls are admitted fairly across tenants (users, see current_tenant), and
+    a connection with too many queued calls rejects new ones at once with
+    AdmissionRejected. Background jobs (see background_work) share at most
+    `max_background_workers` of the workers, so long exports cannot starve
+    interactive queries.
+    """
+
+    def __init__(self, max_workers: int = 16, per_connection_limit: int = 4, max_queued_per_connection: int = 32,
+                 max_background_workers: int = 4):
+        self.per_connection_limit = per_connection_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self.scheduler = FairScheduler(max_workers, per_connection_limit, max_queued_per_connection)
+        # Always leave at least one worker to interactive requests
+        self.background_scheduler = FairScheduler(
+            max(1, min(max_background_workers, max_workers - 1)),
+            per_connection_limit,
+            max_queued_per_connection,
+            name="database_background",
+        )
+
+    async def run(self, connection_id: Optional[str], func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run `func(*args, **kwargs)` on the pool, limited per connection. The
+        caller's context (e.g. its cancel scope) is carried into the thread.
+        """
+        if not connection_id:
+            return await self.run_held(func, *args, **kwargs)
+
+        key = str(connection_id)
+        background = await self._acquire(key)
+        started = time.monotonic()
+        try:
+            return await self.run_held(func, *args, **kwargs)
+        finally:
+            self._release(key, background, time.monotonic() - started)
+
+    async def hold(self, connection_id: str) -> Callable[[], None]:
+        """
+        Take a slot of the connection for a series of calls, e.g. an export
+        that keeps a cursor open between batches, and run them with
+        run_held(). Returns the function giving the slot back, which is safe
+        to call more than once.
+        """
+        key = str(connection_id)
+        background = await self._acquire(key)
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self._release(key, background)
+        return release
+
+    async def run_held(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `func(*args, **kwargs)` on the pool without taking a slot, see hold()"""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def _acquire(self, key: str) -> bool:
+        tenant = current_tenant.get()
+        background = background_work.get()
+        if background:
+            # A background slot first, then a worker like any other call
+            await self.background_scheduler.acquire(key, tenant)
+        try:
+            await self.scheduler.acquire(key, tenant)
+        except BaseException:
+            if background:
+                self.background_scheduler.release(key)
+            raise
+        return background
+
+    def _release(self, key: str, background: bool, held_seconds: Optional[float] = None):
+        self.scheduler.release(key, held_seconds)
+        if background:
+            self.background_scheduler.release(key)
+
+    def check(self, connection_id: str):
+        """Raise AdmissionRejected if the connection's queue is already full"""
+        self.scheduler.check(str(connection_id))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+db_executor = DatabaseExecutor(
+    max_workers=int(os.getenv("DB_EXECUTOR_MAX_WORKERS", "16")),
+    per_connection_limit=int(os.getenv("DB_MAX_CONCURRENCY_PER_CONNECTION", "4")),
+    max_queued_per_connection=int(os.getenv("DB_MAX_QUEUED_PER_CONNECTION", "32")),
+    max_background_workers=int(os.getenv("DB_EXECUTOR_MAX_BACKGROUND_WORKERS", "4")),
+)
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+# SQLAlchemy drivers for providers configured with host/port credentials
+SQLALCHEMY_DRIVERS = {
+    "postgresql": "postgresql+psycopg2",
+    # PyMySQL, as SQLAlchemy's mysql-connector dialect has no server-side
+    # cursors and would buffer every result in full before it is capped
+    "mysql": "mysql+pymysql",
+}
+
+# Connect timeout argument understood by each provider's driver
+CONNECT_ARGS = {
+    "supabase": {"connect_timeout": 30},
+    "postgresql": {"connect_timeout": 30},
+    "mysql": {"connect_timeout": 30},
+}
+
+
+class EngineRegistry:
+    """
+    Process-wide registry of pooled database handles, keyed by connection id:
+    SQLAlchemy engines for SQL providers and MongoClients for MongoDB.
+
+    Handles are reused across tool calls so each query does not pay for a new
+    TCP/TLS/auth handshake. The registry is bounded (LRU) and handles that have
+    been idle for longer than `idle_timeout` seconds are disposed.
+    """
+
+    def __init__(
+        self,
+        max_engines: int = 32,
+        idle_timeout: float = 600,
+        pool_size: int = 5,
+        max_overflow: int = 5,
+    ):
+        self.max_engines = max_engines
+        self.idle_timeout = idle_timeout
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        # connection_id -> (credentials hash, engine, last used timestamp)
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def credentials_hash(credentials: Dict[str, str]) -> str:
+        payload = json.dumps(credentials, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def engine_url(provider: str, credentials: Dict[str, str]):
+        """SQLAlchemy URL for a provider's stored credentials"""
+        if "connection_string" in credentials or provider not in SQLALCHEMY_DRIVERS:
+            return credentials["connection_string"]
+
+        from sqlalchemy.engine import URL
+
+        return URL.create(
+            SQLALCHEMY_DRIVERS[provider],
+            username=credentials["username"],
+            password=credentials["password"],
+            host=credentials["host"],
+            port=int(credentials["port"]),
+            database=credentials["database"]
+        )
+
+    def _create_engine(self, provider: str, credentials: Dict[str, str]):
+        if provider == "mongodb":
+            import pymongo
+
+            return pymongo.MongoClient(
+                credentials["connection_string"],
+                maxPoolSize=self.pool_size + self.max_overflow,
+                maxIdleTimeMS=int(self.idle_timeout * 1000),
+                serverSelectionTimeoutMS=30000,
+                connectTimeoutMS=30000
+            )
+
+        from sqlalchemy import create_engine
+
+        return create_engine(
+            self.engine_url(provider, credentials),
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=30,
+            pool_recycle=3600,
+            pool_pre_ping=True,
+            connect_args=CONNECT_ARGS.get(provider, {})
+        )
+
+    @staticmethod
+    def _dispose(engine):
+        if hasattr(engine, "dispose"):
+            engine.dispose()
+        else:
+            # MongoClient
+            engine.close()
+
+    def get_engine(self, connection_id: str, credentials: Dict[str, str], provider: str = "supabase"):
+        """Return a warm pooled handle for the connection, creating it if needed."""
+        credentials_hash = self.credentials_hash({**credentials, "__provider__": provider})
+        stale = []
+
+        with self._lock:
+            now = time.monotonic()
+            stale.extend(self._pop_idle(now))
+
+            entry = self._engines.get(connection_id)
+            if entry and entry[0] == credentials_hash:
+                engine = entry[1]
+                self._engines[connection_id] = (credentials_hash, engine, now)
+                self._engines.move_to_end(connection_id)
+            else:
+                if entry:
+                    # Credentials changed since the engine was built
+                    stale.append(self._engines.pop(connection_id)[1])
+                engine = self._create_engine(provider, credentials)
+                self._engines[connection_id] = (credentials_hash, engine, now)
+                while len(self._engines) > self.max_engines:
+                    _, (_, evicted, _) = self._engines.popitem(last=False)
+                    stale.append(evicted)
+
+        # Dispose outside the lock, closing pooled connections may block
+        for old_engine in stale:
+            self._dispose(old_engine)
+
+        return engine
+
+    def _pop_idle(self, now: float) -> list:
+        idle = [
+            connection_id
+            for connection_id, (_, _, last_used) in self._engines.items()
+            if now - last_used > self.idle_timeout
+        ]
+        return [self._engines.pop(connection_id)[1] for connection_id in idle]
+
+    def evict_idle(self) -> int:
+        """
+        Dispose engines that have not been used within the idle timeout.
+        Run periodically by the app (see MAINTENANCE_TASKS in main.py), so an
+        idle deployment closes its pooled connections too.
+        """
+        with self._lock:
+            stale = self._pop_idle(time.monotonic())
+        for engine in stale:
+            self._dispose(engine)
+        return len(stale)
+
+    def dispose(self, connection_id: Optional[str]) -> bool:
+        """Dispose the engine for a connection, if one is registered."""
+        if not connection_id:
+            return False
+        with self._lock:
+            entry = self._engines.pop(connection_id, None)
+        if entry is None:
+            return False
+        self._dispose(entry[1])
+        return True
+
+    def dispose_all(self):
+        with self._lock:
+            engines = [entry[1] for entry in self._engines.values()]
+            self._engines.clear()
+        for engine in engines:
+            self._dispose(engine)
+
+
+engine_registry = EngineRegistry(
+    max_engines=int(os.getenv("ENGINE_REGISTRY_MAX_ENGINES", "32")),
+    idle_timeout=float(os.getenv("ENGINE_REGISTRY_IDLE_TIMEOUT", "600")),
+    pool_size=int(os.getenv("ENGINE_POOL_SIZE", "5")),
+    max_overflow=int(os.getenv("ENGINE_POOL_MAX_OVERFLOW", "5")),
+)
@@ -0,0 +1,371 @@
+import asyncio
+import glob
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+from app.services.admission import AdmissionRejected, background_work, current_tenant
+from app.services.cancellation import CancelScope, current_cancel_scope
+from app.services.metrics import admission_rejections_total, jobs_total, phase_seconds
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = ("succeeded", "failed", "cancelled")
+
+
+class JobContext:
+    """What a running job sees: progress reporting, cancellation and its spool file"""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+        self.scope = CancelScope()
+        self.result_path: Optional[str] = None
+        self.media_type: Optional[str] = None
+
+    async def report(self, step: str, progress: Optional[float] = None):
+        """
+        Record what the job is doing. Cancels the job (raises
+        asyncio.CancelledError) if it was cancelled by another worker process.
+        """
+        state = await run_in_threadpool(self.queue._progress, self.job_id, step, progress)
+        if state == "cancelled":
+            raise asyncio.CancelledError(f"Job {self.job_id} was cancelled")
+
+    def spool(self, extension: str, media_type: str) -> str:
+        """Path of the file the job writes its result to"""
+        self.result_path = os.path.join(self.queue.spool_dir, f"{self.job_id}.{extension}")
+        self.media_type = media_type
+        return self.result_path
+
+
+Runner = Callable[[JobContext], Awaitable[None]]
+
+
+class JobQueue:
+    """
+    Background jobs for long-running work (agent chats, full query
+    extracts), so the request that submits one returns a job id at once.
+
+    Job state lives in a local SQLite database shared by every worker on the
+    host, so any worker can report status or serve results. A job runs in the
+    process that accepted it, on one of `max_workers` worker tasks of that
+    process's event loop, and writes its result to a file in `spool_dir`.
+    Finished jobs and their files are removed after `ttl` seconds, and jobs
+    left behind by a worker process that is gone are failed; both run
+    periodically (see MAINTENANCE_TASKS in main.py).
+    """
+
+    def __init__(self, path: str, spool_dir: str, max_workers: int = 2,
+                 max_queued: int = 100, ttl: float = 24 * 3600):
+        self.path = path
+        self.spool_dir = spool_dir
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # job id -> (task, context) of the jobs running in this process
+        self._running: Dict[str, Any] = {}
+        # Jobs recorded under this pid before then belong to an earlier process
+        self._started_at = time.time()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+            self._ensure_schema(connection)
+        return connection
+
+    def _ensure_schema(self, connection: sqlite3.Connection):
+        with self._init_lock:
+            if self._initialized:
+                return
+            os.makedirs(self.spool_dir, exist_ok=True)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    connection_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    step TEXT,
+                    progress REAL,
+                    error TEXT,
+                    result_path TEXT,
+                    media_type TEXT,
+                    worker_pid INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user_id, created_at)")
+            self._initialized = True
+
+    @staticmethod
+    def _public(row: sqlite3.Row) -> Dict[str, Any]:
+        job = {key: row[key] for key in (
+            "id", "connection_id", "kind", "status", "step", "progress", "error",
+            "created_at", "started_at", "finished_at",
+        )}
+        job["has_result"] = row["status"] == "succeeded" and bool(row["result_path"])
+        return job
+
+    async def submit(self, user_id: str, connection_id: str, kind: str, runner: Runner,
+                     on_finish: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+        """
+        Queue `runner` as a job and return its status. Raises
+        AdmissionRejected when this process already has `max_queued` jobs
+        waiting. `on_finish`, if given, is called on the event loop once the
+        job is over, whether it ran or not, or at once if it cannot be queued.
+        """
+        try:
+            if self._queue is None:
+                self._queue = asyncio.Queue()
+            if self._queue.qsize() >= self.max_queued:
+                admission_rejections_total.inc(limit="job_queue")
+                raise AdmissionRejected("Too many queued jobs, try again later", retry_after=30)
+
+            job_id = uuid.uuid4().hex
+            await run_in_threadpool(self._insert, job_id, user_id, connection_id, kind)
+        except BaseException:
+            if on_finish:
+                on_finish()
+            raise
+        self._queue.put_nowait((job_id, str(user_id), kind, runner, on_finish, time.monotonic()))
+        while len(self._workers) < self.max_workers:
+            self._workers.append(asyncio.ensure_future(self._work()))
+        jobs_total.inc(kind=kind, status="queued")
+        return await run_in_threadpool(self.get, user_id, job_id)
+
+    def _insert(self, job_id: str, user_id: str, connection_id: str, kind: str):
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO jobs (id, user_id, connection_id, kind, status, worker_pid, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, str(user_id), str(connection_id), kind, os.getpid(), now, now)
+        )
+
+    def get(self, user_id: str, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT * FROM jobs WHERE id = ? AND user_id = ?", (job_id, str(user_id))
+        ).fetchone()
+        return self._public(row) if row else None
+
+    def list_jobs(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(
+            "SELECT * FROM jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (str(user_id), limit)
+        ).fetchall()
+        return [self._public(row) for row in rows]
+
+    def result(self, user_id: str, job_id: str) -> Optional[Dict[str, str]]:
+        """{"path", "media_type"} of a succeeded job's spooled result"""
+        row = self._connection().execute(
+            "SELECT result_path, media_type FROM jobs WHERE id = ? AND user_id = ? AND status = 'succeeded'",
+            (job_id, str(user_id))
+        ).fetchone()
+        if not row or not row["result_path"] or not os.path.exists(row["result_path"]):
+            return None
+        return {"path": row["result_path"], "media_type": row["media_type"]}
+
+    async def cancel(self, user_id: str, job_id: str) -> bool:
+        """
+        Cancel a queued or running job. A job running in another worker
+        process stops at its next progress report.
+        """
+        updated = await run_in_threadpool(self._mark_cancelled, user_id, job_id)
+        running = self._running.get(job_id)
+        if updated and running:
+            task, context = running
+            context.scope.cancel()
+            task.cancel()
+        return bool(updated)
+
+    def _mark_cancelled(self, user_id: str, job_id: str) -> int:
+        now = time.time()
+        return self._connection().execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ?, updated_at = ? "
+            "WHERE id = ? AND user_id = ? AND status IN ('queued', 'running')",
+            (now, now, job_id, str(user_id))
+        ).rowcount
+
+    def cleanup(self) -> int:
+        """Remove jobs finished (or abandoned) more than `ttl` seconds ago, with their files"""
+        connection = self._connection()
+        expired = connection.execute(
+            "SELECT id, result_path FROM jobs WHERE updated_at < ?", (time.time() - self.ttl,)
+        ).fetchall()
+        for row in expired:
+            if row["result_path"]:
+                try:
+                    os.remove(row["result_path"])
+                except FileNotFoundError:
+                    pass
+            connection.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+        return len(expired)
+
+    def recover(self) -> int:
+        """
+        Fail the queued and running jobs of worker processes that are gone,
+        e.g. killed or restarted without a clean shutdown, with their partial
+        result files.
+        """
+        connection = self._connection()
+        pending = connection.execute(
+            "SELECT id, worker_pid, created_at FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchall()
+        orphaned = [
+            row["id"] for row in pending
+            if not self._owner_alive(row["worker_pid"], row["created_at"])
+        ]
+        now = time.time()
+        for job_id in orphaned:
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted by a server restart', step = NULL, "
+                "finished_at = ?, updated_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (now, now, job_id)
+            )
+            for path in glob.glob(os.path.join(self.spool_dir, f"{job_id}.*")):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return len(orphaned)
+
+    def _owner_alive(self, pid: int, created_at: float) -> bool:
+        if pid == os.getpid():
+            return created_at >= self._started_at
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # Alive, but owned by another user
+            return True
+        return True
+
+    def _progress(self, job_id: str, step: str, progress: Optional[float]) -> Optional[str]:
+        connection = self._connection()
+        connection.execute(
+            "UPDATE jobs SET step = ?, progress = COALESCE(?, progress), updated_at = ? "
+            "WHERE id = ? AND status = 'running'",
+            (step, progress, time.time(), job_id)
+        )
+        row = connection.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def _start(self, job_id: str) -> bool:
+        now = time.time()
+        return bool(self._connection().execute(
+            "UPDATE jobs SET status = 'running', started_at = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+            (now, now, job_id)
+        ).rowcount)
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None,
+                context: Optional[JobContext] = None):
+        now = time.time()
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, error = ?, result_path = ?, media_type = ?, step = NULL, "
+            "progress = CASE WHEN ? = 'succeeded' THEN 1.0 ELSE progress END, finished_at = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'running'",
+            (status, error, context.result_path if context else None, context.media_type if context else None,
+             status, now, now, job_id)
+        )
+
+    async def _work(self):
+        while True:
+            job_id, user_id, kind, runner, on_finish, queued_at = await self._queue.get()
+            try:
+                phase_seconds.observe(time.monotonic() - queued_at, phase="job_queue_wait")
+                await self._run(job_id, user_id, kind, runner)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job %s could not be run", job_id)
+            finally:
+                if on_finish:
+                    on_finish()
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, user_id: str, kind: str, runner: Runner):
+        if not await run_in_threadpool(self._start, job_id):
+            # Cancelled while it was waiting
+            return
+
+        context = JobContext(self, job_id)
+        # The job's database work is cancelled with it and scheduled as its
+        # user's, within the share of the database executor kept for jobs
+        scope_token = current_cancel_scope.set(context.scope)
+        tenant_token = current_tenant.set(user_id)
+        background_token = background_work.set(True)
+        try:
+            task = asyncio.ensure_future(runner(context))
+        finally:
+            background_work.reset(background_token)
+            current_tenant.reset(tenant_token)
+            current_cancel_scope.reset(scope_token)
+        self._running[job_id] = (task, context)
+
+        started = time.perf_counter()
+        status, error = "failed", None
+        try:
+            await task
+            status = "succeeded"
+        except asyncio.CancelledError:
+            if not task.done():
+                # The worker itself is shutting down
+                task.cancel()
+                raise
+            status = "cancelled"
+        except Exception as e:
+            error = str(getattr(e, "detail", None) or e)
+            logger.warning("Job %s failed: %s", job_id, error)
+        finally:
+            self._running.pop(job_id, None)
+            context.scope.cancel()
+            phase_seconds.observe(time.perf_counter() - started, phase=f"job_{kind}")
+            jobs_total.inc(kind=kind, status=status)
+            if status != "succeeded" and context.result_path:
+                try:
+                    os.remove(context.result_path)
+                except FileNotFoundError:
+                    pass
+            await run_in_threadpool(
+                self._finish, job_id, status, error, context if status == "succeeded" else None
+            )
+
+    def shutdown(self):
+        """Stop this process's workers and fail the jobs they still hold"""
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        now = time.time()
+        self._connection().execute(
+            "UPDATE jobs SET status = 'failed', error = 'Interrupted by a server shutdown', "
+            "finished_at = ?, updated_at = ? WHERE worker_pid = ? AND status IN ('queued', 'running')",
+            (now, now, os.getpid())
+        )
+
+
+_state_dir = tempfile.gettempdir()
+
+job_queue = JobQueue(
+    os.getenv("JOB_STORE_PATH") or os.path.join(_state_dir, "db_copilot_jobs.sqlite3"),
+    os.getenv("JOB_SPOOL_DIR") or os.path.join(_state_dir, "db_copilot_jobs"),
+    max_workers=int(os.getenv("JOB_MAX_WORKERS", "2")),
+    max_queued=int(os.getenv("JOB_MAX_QUEUED", "100")),
+    ttl=float(os.getenv("JOB_TTL", str(24 * 3600))),
+)
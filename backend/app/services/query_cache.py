@@ -0,0 +1,123 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from app.services.metrics import record_cache
+
+# Quoted literals/identifiers (including MySQL `backticks`, which can be
+# case-sensitive) are kept verbatim, everything else is normalized
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`(?:[^`]|``)*`)")
+_WORD = re.compile(r"[a-z_]+")
+
+READ_ONLY_LEADING = {"select", "with", "values", "table", "show"}
+WRITE_KEYWORDS = {
+    "insert", "update", "delete", "merge", "upsert", "into", "create", "alter",
+    "drop", "truncate", "grant", "revoke", "copy", "call", "do", "lock",
+    "vacuum", "analyze", "refresh", "comment", "set", "reset", "nextval", "setval",
+}
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Canonical form of a statement for cache keys: whitespace is collapsed,
+    text outside quotes and backticks is lowercased and trailing semicolons
+    are dropped.
+    """
+    parts = _QUOTED.split(query.strip())
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)
+        else:
+            normalized.append(re.sub(r"\s+", " ", part).lower())
+    return "".join(normalized).strip().rstrip(";").strip()
+
+
+def is_read_only(normalized_query: str) -> bool:
+    """Conservative check that a normalized statement only reads data"""
+    unquoted = " ".join(_QUOTED.split(normalized_query)[::2])
+    if ";" in unquoted or "--" in unquoted or "/*" in unquoted:
+        return False
+    words = _WORD.findall(unquoted)
+    if not words or words[0] not in READ_ONLY_LEADING:
+        return False
+    if "for" in words and any(lock in words for lock in ("update", "share")):
+        return False
+    return not WRITE_KEYWORDS.intersection(words)
+
+
+class QueryCache:
+    """
+    TTL + LRU cache of execute_sql_query results keyed by
+    (connection_id, normalized SQL). Only read-only statements are cached.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (connection_id, normalized sql) -> (expires at, result)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, connection_id: str, query: str) -> Optional[Tuple[str, str]]:
+        """Cache key for a statement, or None if it must not be cached."""
+        normalized = normalize_sql(query)
+        if not is_read_only(normalized):
+            return None
+        return (str(connection_id), normalized)
+
+    def get(self, key: Tuple[str, str]) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                record_cache("query", True)
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            record_cache("query", False)
+            return None
+
+    def put(self, key: Tuple[str, str], result: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, connection_id: Optional[str]) -> int:
+        """Drop every cached result for a connection"""
+        if not connection_id:
+            return 0
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == str(connection_id)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+query_cache = QueryCache(
+    max_entries=int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256")),
+    ttl=float(os.getenv("QUERY_CACHE_TTL", "60")),
+)
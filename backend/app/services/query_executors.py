@@ -0,0 +1,565 @@
+import hashlib
+import itertools
+import json
+import os
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Sequence
+from app.services.cancellation import cancellable
+from app.services.engine_registry import engine_registry
+from app.services.metrics import span
+from app.services.query_cache import normalize_sql, is_read_only
+
+# Bounds on what a single query may return to the LLM
+MAX_RESULT_ROWS = int(os.getenv("SQL_MAX_RESULT_ROWS", "200"))
+MAX_RESULT_BYTES = int(os.getenv("SQL_MAX_RESULT_BYTES", "32768"))
+FETCH_BATCH_SIZE = int(os.getenv("SQL_FETCH_BATCH_SIZE", "100"))
+
+# Server-side time budget of a single agent-issued query, unless the
+# connection record sets its own query_timeout_ms
+QUERY_TIMEOUT_MS = int(os.getenv("QUERY_TIMEOUT_MS", "30000"))
+
+
+def query_timeout(conn_data: Dict[str, Any]) -> int:
+    """Statement budget in milliseconds for a connection record"""
+    try:
+        timeout_ms = int(conn_data.get("query_timeout_ms") or 0)
+    except (TypeError, ValueError):
+        timeout_ms = 0
+    return timeout_ms if timeout_ms > 0 else QUERY_TIMEOUT_MS
+
+
+def streams_rows(query: str) -> bool:
+    """
+    Whether a statement can run on a server-side cursor. psycopg2 declares a
+    named cursor for it, which only takes a plain query, so SHOW, EXPLAIN,
+    DDL and writes run on a regular (client-side) cursor instead.
+    """
+    normalized = normalize_sql(query)
+    return is_read_only(normalized) and not normalized.startswith("show")
+
+
+def bounded_result(columns: List[str], rows: Iterable[Sequence[Any]]) -> Dict[str, Any]:
+    """
+    Consume at most MAX_RESULT_ROWS rows / MAX_RESULT_BYTES of serialized data
+    into the columnar result shape shared by every executor:
+    {"columns": [...], "rows": [[...], ...], "row_count": n, "truncated": bool}
+    """
+    kept = []
+    size = len(json.dumps(columns, default=str))
+    truncated = False
+
+    for row in rows:
+        if len(kept) >= MAX_RESULT_ROWS:
+            truncated = True
+            break
+        values = list(row)
+        row_size = len(json.dumps(values, default=str))
+        if size + row_size > MAX_RESULT_BYTES:
+            truncated = True
+            break
+        kept.append(values)
+        size += row_size
+
+    result = {
+        "columns": columns,
+        "rows": kept,
+        "row_count": len(kept),
+        "truncated": truncated
+    }
+    if truncated:
+        result["note"] = (
+            f"Result truncated to {len(kept)} rows. "
+            "Use aggregates, filters or limits to narrow the query."
+        )
+    return result
+
+
+class QueryExecutor:
+    """
+    Provider-specific query execution and introspection over a pooled handle
+    from the engine registry. Every method is blocking and is expected to run
+    on the database executor.
+    """
+
+    provider: str = ""
+
+    def handle(self, connection_id: str, credentials: Dict[str, str]):
+        return engine_registry.get_engine(connection_id, credentials, self.provider)
+
+    def ping(self, connection_id: str, credentials: Dict[str, str]):
+        raise NotImplementedError
+
+    def execute(
+        self,
+        connection_id: str,
+        credentials: Dict[str, str],
+        query: Any,
+        timeout_ms: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run a query into a bounded result. The database aborts it after
+        `timeout_ms`, and it is cancelled early if the request's cancel
+        scope is.
+        """
+        raise NotImplementedError
+
+    def stream(
+        self,
+        connection_id: str,
+        credentials: Dict[str, str],
+        query: Any,
+        batch_size: int,
+        timeout_ms: Optional[int] = None,
+    ) -> Iterator[List[Any]]:
+        """
+        Run a read-only query for export, without any result bounds. Yields
+        the column names, then lists of up to `batch_size` rows read from a
+        server-side cursor, so memory stays flat whatever the result size.
+        Drivers that cannot stream (MySQL through mysql-connector) are
+        refused with a ValueError rather than buffering the result.
+        Blocking: drive it one batch at a time and close it when done, which
+        releases the connection.
+        """
+        raise NotImplementedError
+
+    def fingerprints(self, connection_id: str, credentials: Dict[str, str]) -> Dict[str, str]:
+        """Cheap {table_name: fingerprint} map used to detect schema changes"""
+        raise NotImplementedError
+
+    def introspect(
+        self,
+        connection_id: str,
+        credentials: Dict[str, str],
+        fingerprints: Dict[str, str],
+        table_names: Optional[List[str]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Describe tables as {name: {"fingerprint", "columns": [...]}}; all tables
+        when `table_names` is None. Columns carry column_name, data_type,
+        is_nullable, primary_key and references.
+        """
+        raise NotImplementedError
+
+
+# Catalog queries per SQL dialect. Each returns one fingerprint per table, or
+# every column with its primary/foreign key information in a single query.
+# Fingerprints cover exactly the relations the introspection query sees:
+# information_schema.columns has no materialized views ('m'), so a
+# fingerprint for one would never match and it would be re-read every time.
+POSTGRES_FINGERPRINT_QUERY = """
+    SELECT c.relname AS table_name,
+           md5(
+               string_agg(
+                   a.attname || ':' || format_type(a.atttypid, a.atttypmod) || ':' || a.attnotnull::text,
+                   ',' ORDER BY a.attnum
+               )
+               || coalesce((
+                   SELECT string_agg(con.conname || ':' || con.contype, ',' ORDER BY con.conname)
+                   FROM pg_catalog.pg_constraint con
+                   WHERE con.conrelid = c.oid
+               ), '')
+           ) AS fingerprint
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE n.nspname = :schema AND c.relkind IN ('r', 'p', 'v', 'f')
+    GROUP BY c.oid, c.relname
+"""
+
+POSTGRES_INTROSPECTION_QUERY = """
+    SELECT DISTINCT
+           cols.table_name,
+           cols.column_name,
+           cols.data_type,
+           cols.is_nullable,
+           cols.ordinal_position,
+           pk.column_name IS NOT NULL AS primary_key,
+           fk.foreign_table,
+           fk.foreign_column
+    FROM information_schema.columns cols
+    LEFT JOIN (
+        SELECT kcu.table_name, kcu.column_name
+        FROM information_schema.table_constraints tc
+        JOIN information_schema.key_column_usage kcu
+          ON kcu.constraint_name = tc.constraint_name
+         AND kcu.constraint_schema = tc.constraint_schema
+        WHERE tc.constraint_type = 'PRIMARY KEY' AND tc.table_schema = :schema
+    ) pk ON pk.table_name = cols.table_name AND pk.column_name = cols.column_name
+    LEFT JOIN (
+        SELECT kcu.table_name, kcu.column_name,
+               ccu.table_name AS foreign_table, ccu.column_name AS foreign_column
+        FROM information_schema.table_constraints tc
+        JOIN information_schema.key_column_usage kcu
+          ON kcu.constraint_name = tc.constraint_name
+         AND kcu.constraint_schema = tc.constraint_schema
+        JOIN information_schema.constraint_column_usage ccu
+          ON ccu.constraint_name = tc.constraint_name
+         AND ccu.constraint_schema = tc.constraint_schema
+        WHERE tc.constraint_type = 'FOREIGN KEY' AND tc.table_schema = :schema
+    ) fk ON fk.table_name = cols.table_name AND fk.column_name = cols.column_name
+    WHERE cols.table_schema = :schema {table_filter}
+    ORDER BY cols.table_name, cols.ordinal_position
+"""
+
+MYSQL_FINGERPRINT_QUERY = """
+    SELECT cols.table_name AS table_name,
+           CONCAT(
+               COUNT(*), '-',
+               SUM(CRC32(CONCAT_WS(':', cols.column_name, cols.column_type, cols.is_nullable, cols.column_key)))
+           ) AS fingerprint
+    FROM information_schema.columns cols
+    WHERE cols.table_schema = :schema
+    GROUP BY cols.table_name
+"""
+
+MYSQL_INTROSPECTION_QUERY = """
+    SELECT cols.table_name AS table_name,
+           cols.column_name AS column_name,
+           cols.data_type AS data_type,
+           cols.is_nullable AS is_nullable,
+           cols.ordinal_position AS ordinal_position,
+           cols.column_key = 'PRI' AS primary_key,
+           kcu.referenced_table_name AS foreign_table,
+           kcu.referenced_column_name AS foreign_column
+    FROM information_schema.columns cols
+    LEFT JOIN information_schema.key_column_usage kcu
+      ON kcu.table_schema = cols.table_schema
+     AND kcu.table_name = cols.table_name
+     AND kcu.column_name = cols.column_name
+     AND kcu.referenced_table_name IS NOT NULL
+    WHERE cols.table_schema = :schema {table_filter}
+    ORDER BY cols.table_name, cols.ordinal_position
+"""
+
+
+class SqlQueryExecutor(QueryExecutor):
+    """SQLAlchemy-backed executor for Supabase, PostgreSQL and MySQL"""
+
+    def __init__(self, provider: str, dialect: str):
+        self.provider = provider
+        self.dialect = dialect
+
+    def _schema(self, credentials: Dict[str, str]) -> str:
+        if self.dialect == "mysql":
+            return credentials["database"]
+        return "public"
+
+    def ping(self, connection_id: str, credentials: Dict[str, str]):
+        from sqlalchemy import text
+
+        with self.handle(connection_id, credentials).connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    def execute(self, connection_id, credentials, query, timeout_ms=None):
+        """
+        Run a statement, streaming rows from a server-side cursor (for
+        queries, see streams_rows) into a bounded columnar result. Truncated results carry a planner estimate
+        of the total rows.
+        """
+        from sqlalchemy import text
+
+        with span("engine_acquire"):
+            connection = self.handle(connection_id, credentials).connect()
+        with connection:
+            self._set_timeout(connection, timeout_ms or QUERY_TIMEOUT_MS)
+            with cancellable(self._canceller(connection_id, credentials, connection)):
+                with span("sql_execute"):
+                    result = connection.execution_options(
+                        stream_results=streams_rows(query),
+                        max_row_buffer=FETCH_BATCH_SIZE
+                    ).execute(text(query))
+                with span("row_fetch"):
+                    bounded = bounded_result(list(result.keys()), result)
+                    result.close()
+
+                if bounded["truncated"]:
+                    bounded["total_rows_estimate"] = self._estimate_total_rows(connection, query)
+        return bounded
+
+    def stream(self, connection_id, credentials, query, batch_size, timeout_ms=None):
+        from sqlalchemy import text
+
+        with self.handle(connection_id, credentials).connect() as connection:
+            if self.dialect == "mysql":
+                if not connection.dialect.supports_server_side_cursors:
+                    # e.g. a mysql+mysqlconnector connection string: the
+                    # driver would load the whole result into memory
+                    raise ValueError(
+                        "Exports from MySQL need a driver with server-side cursors, "
+                        "such as PyMySQL (mysql+pymysql)"
+                    )
+                # Rows are read as the client downloads them, don't let the
+                # server give up on a slow client between batches
+                timeout_seconds = max(1, (timeout_ms or QUERY_TIMEOUT_MS) // 1000)
+                connection.execute(text(f"SET SESSION net_write_timeout = {int(timeout_seconds)}"))
+            if self.dialect in ("mysql", "postgresql"):
+                # Exports run whatever SQL they are given, never let it write
+                connection.execute(text("SET TRANSACTION READ ONLY"))
+            self._set_timeout(connection, timeout_ms or QUERY_TIMEOUT_MS)
+            with cancellable(self._canceller(connection_id, credentials, connection)):
+                result = connection.execution_options(
+                    stream_results=streams_rows(query),
+                    max_row_buffer=batch_size
+                ).execute(text(query))
+                try:
+                    yield list(result.keys())
+                    for rows in result.partitions(batch_size):
+                        yield [tuple(row) for row in rows]
+                finally:
+                    result.close()
+
+    def _set_timeout(self, connection, timeout_ms: int):
+        from sqlalchemy import text
+
+        if self.dialect == "mysql":
+            # Only applies to SELECT statements, which is what the agent runs
+            connection.execute(text(f"SET SESSION MAX_EXECUTION_TIME = {int(timeout_ms)}"))
+        elif self.dialect == "postgresql":
+            # Scoped to the current transaction, so the pooled connection
+            # goes back to the pool with its default
+            connection.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+
+    def _canceller(self, connection_id: str, credentials: Dict[str, str], connection):
+        """Callback that aborts the statement running on `connection` from another thread"""
+        from sqlalchemy import text
+
+        dbapi_connection = connection.connection.dbapi_connection
+        if self.dialect == "mysql":
+            thread_id = dbapi_connection.thread_id() if hasattr(dbapi_connection, "thread_id") else None
+
+            def kill_query():
+                if thread_id is None:
+                    return
+                with self.handle(connection_id, credentials).connect() as killer:
+                    killer.execute(text(f"KILL QUERY {int(thread_id)}"))
+            return kill_query
+
+        # psycopg2 sends a cancel request on a separate socket
+        return getattr(dbapi_connection, "cancel", lambda: None)
+
+    def explain(self, connection_id: str, credentials: Dict[str, str], query: str) -> Optional[Dict[str, Any]]:
+        """
+        Planner summary of a statement without running it:
+        {"rows": estimated rows, "cost": planner cost (None on MySQL),
+         "full_scans": [{"table", "rows"}, ...]}. None if it cannot be explained.
+        """
+        with self.handle(connection_id, credentials).connect() as connection:
+            return self._explain(connection, query)
+
+    def _explain(self, connection, query: str) -> Optional[Dict[str, Any]]:
+        from sqlalchemy import text
+
+        statement = query.strip().rstrip(';')
+        try:
+            if self.dialect == "mysql":
+                rows = connection.execute(text(f"EXPLAIN {statement}")).mappings().all()
+                if not rows:
+                    return None
+                return {
+                    "rows": max(int(row["rows"] or 0) for row in rows),
+                    "cost": None,
+                    "full_scans": [
+                        {"table": row["table"], "rows": int(row["rows"] or 0)}
+                        for row in rows if row["type"] == "ALL"
+                    ],
+                }
+
+            plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {statement}")).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            root = plan[0]["Plan"]
+            full_scans = []
+            nodes = [root]
+            while nodes:
+                node = nodes.pop()
+                if node.get("Node Type") == "Seq Scan":
+                    full_scans.append({"table": node.get("Relation Name"), "rows": int(node.get("Plan Rows", 0))})
+                nodes.extend(node.get("Plans", []))
+            return {"rows": int(root["Plan Rows"]), "cost": float(root["Total Cost"]), "full_scans": full_scans}
+        except Exception:
+            return None
+
+    def _estimate_total_rows(self, connection, query: str) -> Optional[int]:
+        """Planner estimate of the rows a query returns, without running it"""
+        plan = self._explain(connection, query)
+        return plan["rows"] if plan else None
+
+    def fingerprints(self, connection_id: str, credentials: Dict[str, str]) -> Dict[str, str]:
+        from sqlalchemy import text
+
+        query = MYSQL_FINGERPRINT_QUERY if self.dialect == "mysql" else POSTGRES_FINGERPRINT_QUERY
+        with self.handle(connection_id, credentials).connect() as connection:
+            return {
+                row.table_name: str(row.fingerprint)
+                for row in connection.execute(text(query), {"schema": self._schema(credentials)})
+            }
+
+    def introspect(self, connection_id, credentials, fingerprints, table_names=None):
+        from sqlalchemy import text, bindparam
+
+        template = MYSQL_INTROSPECTION_QUERY if self.dialect == "mysql" else POSTGRES_INTROSPECTION_QUERY
+        params = {"schema": self._schema(credentials)}
+        if table_names is None:
+            query = text(template.format(table_filter=""))
+        else:
+            query = text(template.format(table_filter="AND cols.table_name IN :tables"))
+            query = query.bindparams(bindparam("tables", expanding=True))
+            params["tables"] = list(table_names)
+
+        tables: Dict[str, Dict[str, Any]] = {}
+        with self.handle(connection_id, credentials).connect() as connection:
+            for row in connection.execute(query, params):
+                if row.table_name not in fingerprints:
+                    continue
+                entry = tables.setdefault(row.table_name, {
+                    "fingerprint": fingerprints[row.table_name],
+                    "columns": [],
+                })
+                columns = entry["columns"]
+                if columns and columns[-1]["column_name"] == row.column_name:
+                    # A column taking part in several foreign keys
+                    if row.foreign_table:
+                        columns[-1]["references"].append(f"{row.foreign_table}.{row.foreign_column}")
+                    continue
+                columns.append({
+                    "column_name": row.column_name,
+                    "data_type": row.data_type,
+                    "is_nullable": row.is_nullable,
+                    "primary_key": bool(row.primary_key),
+                    "references": [f"{row.foreign_table}.{row.foreign_column}"] if row.foreign_table else [],
+                })
+        return tables
+
+
+class MongoQueryExecutor(QueryExecutor):
+    """
+    Executor over a pooled MongoClient. Queries are aggregation pipelines:
+    {"collection": "...", "pipeline": [...]}. Collection schemas are inferred
+    from a sample of documents.
+    """
+
+    provider = "mongodb"
+    SAMPLE_SIZE = 50
+    WRITE_STAGES = {"$out", "$merge"}
+
+    def _database(self, connection_id: str, credentials: Dict[str, str]):
+        client = self.handle(connection_id, credentials)
+        if credentials.get("database"):
+            return client[credentials["database"]]
+        return client.get_default_database()
+
+    def ping(self, connection_id: str, credentials: Dict[str, str]):
+        self.handle(connection_id, credentials).admin.command("ping")
+
+    def _pipeline(self, query: Any):
+        """(collection, pipeline) of a query, rejecting pipelines that write"""
+        if isinstance(query, str):
+            query = json.loads(query)
+        pipeline = list(query.get("pipeline") or [])
+        if any(stage_name in self.WRITE_STAGES for stage in pipeline for stage_name in stage):
+            raise ValueError("Pipelines writing data ($out, $merge) are not allowed")
+        return query["collection"], pipeline
+
+    def execute(self, connection_id, credentials, query, timeout_ms=None):
+        collection, pipeline = self._pipeline(query)
+
+        # Never let the server produce more documents than we would keep
+        pipeline.append({"$limit": MAX_RESULT_ROWS + 1})
+        with span("engine_acquire"):
+            database = self._database(connection_id, credentials)
+        with span("sql_execute"):
+            cursor = database[collection].aggregate(
+                pipeline, batchSize=FETCH_BATCH_SIZE, maxTimeMS=timeout_ms or QUERY_TIMEOUT_MS
+            )
+        try:
+            # Closing the cursor kills it on the server between batches
+            with cancellable(cursor.close), span("row_fetch"):
+                documents = bounded_result(["document"], ([document] for document in cursor))
+        finally:
+            cursor.close()
+
+        # Flatten into columns (union of keys, in first-seen order)
+        columns: List[str] = []
+        for (document,) in documents["rows"]:
+            for key in document:
+                if key not in columns:
+                    columns.append(key)
+        documents["columns"] = columns
+        documents["rows"] = [[document.get(key) for key in columns] for (document,) in documents["rows"]]
+        return documents
+
+    def stream(self, connection_id, credentials, query, batch_size, timeout_ms=None):
+        """
+        Documents have no fixed columns: the columns are the keys of the
+        first batch, later documents are projected onto them.
+        """
+        collection, pipeline = self._pipeline(query)
+        database = self._database(connection_id, credentials)
+        cursor = database[collection].aggregate(
+            pipeline, batchSize=batch_size, maxTimeMS=timeout_ms or QUERY_TIMEOUT_MS
+        )
+        try:
+            with cancellable(cursor.close):
+                documents = list(itertools.islice(cursor, batch_size))
+                columns: List[str] = []
+                for document in documents:
+                    for key in document:
+                        if key not in columns:
+                            columns.append(key)
+                yield columns
+                while documents:
+                    yield [tuple(document.get(key) for key in columns) for document in documents]
+                    documents = list(itertools.islice(cursor, batch_size))
+        finally:
+            cursor.close()
+
+    def fingerprints(self, connection_id: str, credentials: Dict[str, str]) -> Dict[str, str]:
+        # Collections have no declared columns, so a collection is only
+        # re-sampled when its options (e.g. validator) change
+        database = self._database(connection_id, credentials)
+        return {
+            info["name"]: hashlib.md5(
+                json.dumps(info.get("options", {}), sort_keys=True, default=str).encode("utf-8")
+            ).hexdigest()
+            for info in database.list_collections()
+            if not info["name"].startswith("system.")
+        }
+
+    def introspect(self, connection_id, credentials, fingerprints, table_names=None):
+        database = self._database(connection_id, credentials)
+        tables = {}
+        for name in (table_names if table_names is not None else list(fingerprints)):
+            if name not in fingerprints:
+                continue
+            samples = list(database[name].aggregate([{"$sample": {"size": self.SAMPLE_SIZE}}]))
+            fields: Dict[str, set] = {}
+            seen: Dict[str, int] = {}
+            for document in samples:
+                for key, value in document.items():
+                    fields.setdefault(key, set()).add(type(value).__name__)
+                    seen[key] = seen.get(key, 0) + 1
+            tables[name] = {
+                "fingerprint": fingerprints[name],
+                "columns": [
+                    {
+                        "column_name": key,
+                        "data_type": "|".join(sorted(types)),
+                        "is_nullable": "NO" if seen[key] == len(samples) else "YES",
+                        "primary_key": key == "_id",
+                        "references": [],
+                    }
+                    for key, types in fields.items()
+                ],
+            }
+        return tables
+
+
+executors: Dict[str, QueryExecutor] = {
+    "supabase": SqlQueryExecutor("supabase", "postgresql"),
+    "postgresql": SqlQueryExecutor("postgresql", "postgresql"),
+    "mysql": SqlQueryExecutor("mysql", "mysql"),
+    "mongodb": MongoQueryExecutor(),
+}
+
+
+def get_executor(provider: str) -> Optional[QueryExecutor]:
+    return executors.get(provider)
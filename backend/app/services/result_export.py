@@ -0,0 +1,307 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+from app.services.cancellation import CancelScope, current_cancel_scope
+from app.services.db_executor import db_executor
+from app.services.metrics import export_rows_total, span
+from app.services.query_executors import QueryExecutor
+
+
+# Rows fetched from the database and written out per step
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+# Server-side time budget of one export statement
+EXPORT_TIMEOUT_MS = int(os.getenv("EXPORT_TIMEOUT_MS", "1800000"))
+
+
+def _pyarrow():
+    """
+    pyarrow, the optional dependency of the Arrow and Parquet formats,
+    imported on first use. None if it is not installed.
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+class CsvWriter:
+    name = "csv"
+    media_type = "text/csv"
+    extension = "csv"
+
+    def header(self, columns: List[str]) -> bytes:
+        return self.batch([columns])
+
+    def batch(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class NdjsonWriter:
+    name = "ndjson"
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def __init__(self):
+        self.columns: List[str] = []
+
+    def header(self, columns: List[str]) -> bytes:
+        self.columns = columns
+        return b""
+
+    def batch(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(self.columns, row)), default=str) + "\n" for row in rows
+        ).encode("utf-8")
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ArrowWriter:
+    """
+    Arrow IPC stream, one record batch per fetched batch. Column types are
+    inferred from the first batch, with decimals widened to the largest
+    precision so bigger values still fit; columns without a native Arrow
+    type (or only NULLs) are written as strings. Later batches are cast to
+    those types safely: a value that would be truncated or no longer fits
+    fails the export instead of being written wrong.
+    """
+
+    name = "arrow"
+    media_type = "application/vnd.apache.arrow.stream"
+    extension = "arrows"
+
+    def __init__(self):
+        self.pa = _pyarrow()
+        self.sink = _ChunkSink()
+        self.columns: List[str] = []
+        self.schema = None
+        self.writer = None
+
+    def _open(self, schema):
+        return self.pa.ipc.new_stream(self.sink, schema)
+
+    def _write(self, table):
+        self.writer.write_table(table)
+
+    def header(self, columns: List[str]) -> bytes:
+        self.columns = columns
+        return b""
+
+    def _infer(self, values: List[Any]):
+        try:
+            array = self.pa.array(values)
+        except (self.pa.ArrowInvalid, self.pa.ArrowTypeError, TypeError):
+            return self._array(values, self.pa.string())
+        if self.pa.types.is_null(array.type):
+            return self._array(values, self.pa.string())
+        if self.pa.types.is_decimal128(array.type):
+            return array.cast(self.pa.decimal128(38, array.type.scale))
+        return array
+
+    def _array(self, values: List[Any], data_type):
+        if self.pa.types.is_string(data_type):
+            values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+            return self.pa.array(values, type=data_type)
+        array = self.pa.array(values)
+        return array if array.type == data_type else array.cast(data_type, safe=True)
+
+    def batch(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        columns = list(zip(*rows)) if rows else [()] * len(self.columns)
+        if self.schema is None:
+            arrays = [self._infer(list(values)) for values in columns]
+            self.schema = self.pa.schema(
+                [self.pa.field(name, array.type) for name, array in zip(self.columns, arrays)]
+            )
+            self.writer = self._open(self.schema)
+        else:
+            arrays = []
+            for values, field in zip(columns, self.schema):
+                try:
+                    arrays.append(self._array(list(values), field.type))
+                except (self.pa.ArrowInvalid, self.pa.ArrowTypeError, TypeError) as e:
+                    raise ValueError(f"Column {field.name} no longer fits its {field.type} type: {e}")
+        self._write(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        return self.sink.drain()
+
+    def footer(self) -> bytes:
+        if self.writer is None:
+            # Empty result: still a valid file with the column names
+            self.batch([])
+        self.writer.close()
+        return self.sink.drain()
+
+
+class ParquetWriter(ArrowWriter):
+    """Parquet file, one row group per fetched batch"""
+
+    name = "parquet"
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def _open(self, schema):
+        return self.pa.parquet.ParquetWriter(self.sink, schema)
+
+    def _write(self, table):
+        self.writer.write_table(table, row_group_size=max(len(table), 1))
+
+
+WRITERS = {
+    "csv": CsvWriter,
+    "ndjson": NdjsonWriter,
+    "arrow": ArrowWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def create_writer(export_format: str):
+    """Writer for an export format. Raises ValueError if it is unavailable."""
+    writer_class = WRITERS.get(export_format)
+    if writer_class is None:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    if issubclass(writer_class, ArrowWriter) and _pyarrow() is None:
+        raise ValueError(f"The {export_format} format requires the pyarrow package")
+    return writer_class()
+
+
+class ResultExport:
+    """
+    Streams the full result of one query in a file format, batch by batch,
+    from a server-side cursor. At most one batch is held in memory. The
+    export holds one of the connection's database executor slots from
+    start() until it ends, as its pooled connection and cursor stay open
+    while the client reads. MySQL exports stream through PyMySQL's
+    unbuffered cursor; connections whose driver would buffer the whole
+    result are refused when the export starts.
+
+    Call start() before sending the response, so a failing statement (or a
+    first batch the file format cannot hold) can still be reported as an
+    HTTP error, then iterate body(). close() ends an export that never got
+    to run its body.
+    """
+
+    def __init__(self, executor: QueryExecutor, connection_id: str, credentials: Dict[str, str],
+                 query: Any, writer, batch_size: int = EXPORT_BATCH_SIZE,
+                 timeout_ms: int = EXPORT_TIMEOUT_MS):
+        self.connection_id = connection_id
+        self.writer = writer
+        self.scope = CancelScope()
+        self._rows = executor.stream(connection_id, credentials, query, batch_size, timeout_ms=timeout_ms)
+        # Held while the cursor is in use, so _close() waits for a running fetch
+        self._lock = threading.Lock()
+        self._header = b""
+        self._exhausted = False
+        self._finished = False
+        self._release_slot = None
+        # Rows streamed so far
+        self.rows = 0
+
+    def _fetch(self) -> Optional[List[Any]]:
+        with self._lock:
+            return next(self._rows, None)
+
+    def _close(self):
+        with self._lock:
+            self._rows.close()
+
+    async def _next(self) -> Optional[List[Any]]:
+        token = current_cancel_scope.set(self.scope)
+        try:
+            with span("export_fetch"):
+                return await db_executor.run_held(self._fetch)
+        finally:
+            current_cancel_scope.reset(token)
+
+    def _write(self, rows: List[Any]) -> bytes:
+        self.rows += len(rows)
+        export_rows_total.inc(len(rows), format=self.writer.name)
+        return self.writer.batch(rows)
+
+    async def start(self):
+        """Run the statement up to its first batch of rows. Raises if it fails."""
+        try:
+            self._release_slot = await db_executor.hold(self.connection_id)
+            columns = await self._next()
+            self._header = self.writer.header(columns or [])
+            rows = await self._next()
+            if rows is None:
+                self._exhausted = True
+            else:
+                self._header += self._write(rows)
+        except BaseException:
+            self.abort()
+            raise
+
+    async def body(self) -> AsyncIterator[bytes]:
+        try:
+            if self._header:
+                yield self._header
+            while not self._exhausted:
+                rows = await self._next()
+                if rows is None:
+                    break
+                yield self._write(rows)
+            self._finished = True
+            self._release()
+            footer = self.writer.footer()
+            if footer:
+                yield footer
+        finally:
+            self.close()
+
+    def _release(self):
+        if self._release_slot:
+            self._release_slot()
+
+    def close(self):
+        """Abort the export unless it has finished. Safe to call more than once."""
+        if not self._finished:
+            self.abort()
+
+    def abort(self):
+        """
+        Abort the export: cancel the statement if it is still running and
+        release its connection in the background, as the caller may itself
+        be in the middle of being cancelled. The executor slot is given back
+        once the connection is released.
+        """
+        self._finished = True
+        self.scope.cancel()
+        closing = asyncio.get_running_loop().run_in_executor(None, self._close)
+        closing.add_done_callback(lambda _: self._release())
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from app.services.connection_cache import connection_cache
+from app.services.engine_registry import engine_registry
+from app.services.query_executors import get_executor
+
+logger = logging.getLogger(__name__)
+
+_TERM = re.compile(r"[a-z0-9]+")
+# Question words that say nothing about which tables are meant
+STOP_WORDS = {
+    "the", "and", "for", "are", "was", "were", "has", "have", "how", "many", "much",
+    "what", "which", "who", "whose", "when", "where", "with", "from", "that", "this",
+    "all", "each", "per", "list", "show", "give", "find", "get", "top", "most", "more",
+    "than", "does", "did", "there", "their", "them", "any", "into", "between", "over",
+}
+
+
+def lexical_terms(text: str) -> set:
+    """Lowercased, crudely singularized words of `text`, split on `_` as well"""
+    terms = set()
+    for term in _TERM.findall(text.lower()):
+        if len(term) < 3 or term in STOP_WORDS:
+            continue
+        if term.endswith("ies") and len(term) > 4:
+            term = term[:-3] + "y"
+        elif term.endswith("s") and not term.endswith("ss") and len(term) > 3:
+            term = term[:-1]
+        terms.add(term)
+    return terms
+
+
+class SchemaCatalog:
+    """
+    Per-connection in-memory catalog of tables, columns and keys.
+
+    The catalog is introspected in bulk once through the provider's query
+    executor, then kept current by comparing per-table fingerprints and
+    re-reading only the tables that changed.
+    When `persist_dir` is set, catalogs are also saved as JSON files so a
+    restarted process starts warm.
+    """
+
+    def __init__(self, refresh_interval: float = 60, persist_dir: Optional[str] = None):
+        self.refresh_interval = refresh_interval
+        self.persist_dir = persist_dir
+        # connection_id -> {"credentials_hash", "checked_at", "tables": {name: {...}}}
+        self._catalogs: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _connection_lock(self, connection_id: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(connection_id, threading.Lock())
+
+    def get_tables(self, connection_id: str) -> Dict[str, Dict[str, Any]]:
+        """Return {table_name: table entry} for the connection, refreshing if due."""
+        connection_id = str(connection_id)
+        catalog = self._catalogs.get(connection_id)
+        if catalog and time.monotonic() - catalog["checked_at"] < self.refresh_interval:
+            return catalog["tables"]
+        return self.refresh(connection_id)["tables"]
+
+    def list_tables(self, connection_id: str) -> List[str]:
+        return sorted(self.get_tables(connection_id))
+
+    def get_table(self, connection_id: str, table_name: str) -> Optional[Dict[str, Any]]:
+        return self.get_tables(connection_id).get(table_name)
+
+    def fingerprint(self, connection_id: str) -> Optional[str]:
+        """Fingerprint of the whole catalog, or None if it has not been loaded."""
+        catalog = self._catalogs.get(str(connection_id))
+        if not catalog:
+            return None
+        return self._combine_fingerprints(catalog["tables"])
+
+    def refresh(self, connection_id: str, force: bool = False) -> Dict[str, Any]:
+        """
+        Bring the catalog up to date. Only tables whose fingerprint changed
+        are re-introspected unless `force` is set.
+        """
+        connection_id = str(connection_id)
+        with self._connection_lock(connection_id):
+            conn_data = connection_cache.get(connection_id)
+            if not conn_data:
+                raise ValueError(f"Connection {connection_id} not found")
+            credentials = conn_data['credentials']
+            db_provider = conn_data.get('db_provider_name', conn_data['db_name'])
+            executor = get_executor(db_provider)
+            if executor is None:
+                raise ValueError(f"Unsupported provider: {db_provider}")
+            credentials_hash = engine_registry.credentials_hash(credentials)
+
+            catalog = self._catalogs.get(connection_id) or self._load(connection_id)
+            if force or not catalog or catalog.get("credentials_hash") != credentials_hash:
+                catalog = {"credentials_hash": credentials_hash, "tables": {}}
+
+            fingerprints = executor.fingerprints(connection_id, credentials)
+            tables = {
+                name: entry for name, entry in catalog["tables"].items()
+                if fingerprints.get(name) == entry["fingerprint"]
+            }
+            changed = [name for name in fingerprints if name not in tables]
+            if changed:
+                # Read everything in one pass when starting cold
+                tables.update(executor.introspect(
+                    connection_id, credentials, fingerprints, changed if tables else None
+                ))
+
+            schema_changed = bool(changed) or set(tables) != set(catalog["tables"])
+            catalog["tables"] = tables
+            catalog["checked_at"] = time.monotonic()
+            if schema_changed:
+                catalog.pop("summary", None)
+            self._catalogs[connection_id] = catalog
+            if schema_changed or force:
+                self._save(connection_id, catalog)
+            return catalog
+
+    def summary(self, connection_id: str) -> str:
+        """
+        Compact DDL-like description of the schema for the LLM prompt, one
+        line per table, e.g. `orders(id integer PK, user_id integer -> users.id)`.
+        Cached until the catalog changes.
+        """
+        connection_id = str(connection_id)
+        tables = self.get_tables(connection_id)
+        catalog = self._catalogs[connection_id]
+        if catalog.get("summary") is None:
+            catalog["summary"] = "\n".join(
+                self.format_table(name, tables[name]) for name in sorted(tables)
+            )
+        return catalog["summary"]
+
+    def relevant_summary(self, connection_id: str, question: str, max_tables: int = 15,
+                         max_chars: int = 6000) -> str:
+        """
+        Schema summary for one question: tables are ranked by lexical overlap
+        of their table and column names with the question, the tables they
+        reference are pulled in next to them, and the result is pruned to
+        `max_tables` tables / `max_chars` characters.
+        """
+        tables = self.get_tables(connection_id)
+        terms = lexical_terms(question)
+        scores = {name: self._relevance(name, table, terms) for name, table in tables.items()}
+        ranked = sorted(tables, key=lambda name: (-scores[name], name))
+
+        selected: List[str] = []
+        for name in ranked:
+            if len(selected) >= max_tables:
+                break
+            if name in selected:
+                continue
+            selected.append(name)
+            if scores[name] > 0:
+                for column in tables[name]["columns"]:
+                    for reference in column["references"]:
+                        referenced = reference.split(".", 1)[0]
+                        if referenced in tables and referenced not in selected and len(selected) < max_tables:
+                            selected.append(referenced)
+
+        lines = []
+        size = 0
+        for name in selected:
+            line = self.format_table(name, tables[name])
+            if lines and size + len(line) > max_chars:
+                break
+            lines.append(line)
+            size += len(line) + 1
+
+        omitted = len(tables) - len(lines)
+        if omitted:
+            lines.append(f"-- {omitted} more tables not shown, use list_tables / get_table_schema to inspect them")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _relevance(table_name: str, table: Dict[str, Any], terms: set) -> int:
+        if not terms:
+            return 0
+        name_terms = lexical_terms(table_name)
+        score = 3 * len(terms & name_terms)
+        if name_terms and name_terms <= terms:
+            # The question names the table itself, not just a related one
+            score += 2
+        for column in table["columns"]:
+            score += len(terms & lexical_terms(column["column_name"]))
+        return score
+
+    @staticmethod
+    def format_table(table_name: str, table: Dict[str, Any]) -> str:
+        columns = []
+        for column in table["columns"]:
+            parts = [column["column_name"], column["data_type"]]
+            if column["primary_key"]:
+                parts.append("PK")
+            parts.extend(f"-> {reference}" for reference in column["references"])
+            columns.append(" ".join(parts))
+        return f"{table_name}({', '.join(columns)})"
+
+    def invalidate(self, connection_id: Optional[str]):
+        """Drop the in-memory catalog; a persisted copy is revalidated on next use."""
+        if not connection_id:
+            return
+        self._catalogs.pop(str(connection_id), None)
+
+    @staticmethod
+    def _combine_fingerprints(tables: Dict[str, Dict[str, Any]]) -> str:
+        payload = ",".join(f"{name}:{tables[name]['fingerprint']}" for name in sorted(tables))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, connection_id: str) -> str:
+        safe_id = "".join(ch for ch in connection_id if ch.isalnum() or ch in "-_")
+        return os.path.join(self.persist_dir, f"{safe_id}.json")
+
+    def _load(self, connection_id: str) -> Optional[Dict[str, Any]]:
+        if not self.persist_dir:
+            return None
+        try:
+            with open(self._path(connection_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, connection_id: str, catalog: Dict[str, Any]):
+        if not self.persist_dir:
+            return
+        try:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            path = self._path(connection_id)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "credentials_hash": catalog["credentials_hash"],
+                    "tables": catalog["tables"],
+                }, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to persist schema catalog for %s: %s", connection_id, e)
+
+
+schema_catalog = SchemaCatalog(
+    refresh_interval=float(os.getenv("SCHEMA_CATALOG_REFRESH_INTERVAL", "60")),
+    persist_dir=os.getenv("SCHEMA_CATALOG_DIR") or None,
+)
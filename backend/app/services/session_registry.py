@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import List
+
+
+class SessionRegistry:
+    """
+    Registry of active (user, connection) sessions.
+
+    State lives in a local SQLite database so every uvicorn worker on the
+    host sees the same sessions. Live pooled handles are process-local and
+    kept by the engine registry; this only records who is connected to what.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            self._local.connection = connection
+            self._ensure_schema(connection)
+        return connection
+
+    def _ensure_schema(self, connection: sqlite3.Connection):
+        with self._init_lock:
+            if self._initialized:
+                return
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    user_id TEXT NOT NULL,
+                    connection_id TEXT NOT NULL,
+                    worker_pid INTEGER NOT NULL,
+                    connected_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, connection_id)
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS sessions_connection ON sessions (connection_id)")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS revoked_tokens (
+                    token_hash TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._initialized = True
+
+    def activate(self, user_id: str, connection_id: str):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO sessions (user_id, connection_id, worker_pid, connected_at) VALUES (?, ?, ?, ?)",
+            (str(user_id), str(connection_id), os.getpid(), time.time())
+        )
+
+    def deactivate(self, user_id: str, connection_id: str) -> bool:
+        cursor = self._connection().execute(
+            "DELETE FROM sessions WHERE user_id = ? AND connection_id = ?",
+            (str(user_id), str(connection_id))
+        )
+        return cursor.rowcount > 0
+
+    def active_connections(self, user_id: str) -> List[str]:
+        rows = self._connection().execute(
+            "SELECT connection_id FROM sessions WHERE user_id = ? ORDER BY connected_at",
+            (str(user_id),)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def is_active(self, connection_id: str) -> bool:
+        """Whether any user still has the connection open"""
+        row = self._connection().execute(
+            "SELECT 1 FROM sessions WHERE connection_id = ? LIMIT 1",
+            (str(connection_id),)
+        ).fetchone()
+        return row is not None
+
+    def revoke_token(self, token_hash: str, expires_at: float):
+        """Record a signed-out token until it expires; expired records are dropped"""
+        connection = self._connection()
+        connection.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (time.time(),))
+        connection.execute(
+            "INSERT OR REPLACE INTO revoked_tokens (token_hash, expires_at) VALUES (?, ?)",
+            (token_hash, expires_at)
+        )
+
+    def is_token_revoked(self, token_hash: str) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM revoked_tokens WHERE token_hash = ? AND expires_at > ?",
+            (token_hash, time.time())
+        ).fetchone()
+        return row is not None
+
+
+session_registry = SessionRegistry(
+    os.getenv("SESSION_STORE_PATH") or os.path.join(tempfile.gettempdir(), "db_copilot_sessions.sqlite3")
+)
@@ -0,0 +1,104 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+from app.services.connection_cache import connection_cache
+from app.services.query_executors import get_executor
+from app.services.schema_catalog import schema_catalog
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupManager:
+    """
+    Warms a connection in the background after it is connected: opens a
+    pooled connection and introspects the schema catalog that the LLM prompt
+    is built from, so the first chat starts hot.
+
+    Progress is kept in memory by the worker process that ran the warm-up;
+    other workers report the state as unknown.
+    """
+
+    STEPS = ["connecting", "introspecting"]
+
+    def __init__(self, max_workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warmup")
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def start(self, connection_id: str) -> bool:
+        """Schedule a warm-up. Returns False if one is already in progress."""
+        connection_id = str(connection_id)
+        with self._lock:
+            current = self._status.get(connection_id)
+            if current and current["state"] in ("pending", "running"):
+                return False
+            self._status[connection_id] = {
+                "state": "pending",
+                "step": None,
+                "progress": 0.0,
+                "tables": None,
+                "error": None,
+                "started_at": time.time(),
+                "finished_at": None,
+            }
+        self._executor.submit(self._run, connection_id)
+        return True
+
+    def status(self, connection_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            status = self._status.get(str(connection_id))
+            return dict(status) if status else None
+
+    def forget(self, connection_id: Optional[str]):
+        if not connection_id:
+            return
+        with self._lock:
+            self._status.pop(str(connection_id), None)
+
+    def _update(self, connection_id: str, **fields):
+        with self._lock:
+            if connection_id in self._status:
+                self._status[connection_id].update(fields)
+
+    def _step(self, connection_id: str, step: str):
+        self._update(
+            connection_id,
+            state="running",
+            step=step,
+            progress=self.STEPS.index(step) / len(self.STEPS),
+        )
+
+    def _fail(self, connection_id: str, error: str):
+        # `error` is a short code shown to clients, driver messages only go to the log
+        self._update(connection_id, state="failed", error=error, finished_at=time.time())
+
+    def _run(self, connection_id: str):
+        step = "loading"
+        try:
+            conn_data = connection_cache.get(connection_id)
+            if not conn_data:
+                return self._fail(connection_id, "not_found")
+            db_provider = conn_data.get('db_provider_name', conn_data['db_name'])
+            executor = get_executor(db_provider)
+            if executor is None:
+                return self._fail(connection_id, "unsupported_provider")
+
+            step = "connecting"
+            self._step(connection_id, step)
+            executor.ping(connection_id, conn_data['credentials'])
+
+            step = "introspecting"
+            self._step(connection_id, step)
+            tables = schema_catalog.refresh(connection_id)["tables"]
+            self._update(connection_id, tables=len(tables))
+
+            self._update(connection_id, state="ready", step=None, progress=1.0, finished_at=time.time())
+        except Exception as e:
+            logger.warning("Warm-up failed for connection %s while %s: %s", connection_id, step, e)
+            self._fail(connection_id, f"{step}_failed")
+
+
+warmup_manager = WarmupManager(max_workers=int(os.getenv("WARMUP_MAX_WORKERS", "4")))
@@ -1,132 +1,182 @@
+import json
+import logging
+from typing import List, Dict, Any
+from ..services.connection_cache import connection_cache
+from ..services.schema_catalog import schema_catalog
+from ..services.query_cache import query_cache
+from ..services.cost_guard import cost_guard
+from ..services.metrics import span
+from ..services.query_executors import get_executor, query_timeout
 
-from typing import List, Dict, Any, Optional
-from ..services.database_service import database_service
-from ..services.db_connect import get_supabase_client
-from supabase import create_client
+logger = logging.getLogger(__name__)
 
 class DatabaseTools:
     def _get_connection_data(self, connection_id: str):
-        """Get connection data from database"""
-        supabase = get_supabase_client()
-        if not supabase:
-            raise ValueError("Failed to initialize Supabase client")
-        
-        result = supabase.table("connections").select("*").eq("id", connection_id).execute()
-        if not result.data:
+        """Get connection data from the shared connection cache"""
+        conn_data = connection_cache.get(connection_id)
+        if not conn_data:
             raise ValueError(f"Connection {connection_id} not found")
         
-        return result.data[0]
+        return conn_data
+
+    def _get_executor(self, conn_data: Dict[str, Any]):
+        db_provider = conn_data.get('db_provider_name', conn_data['db_name'])
+        executor = get_executor(db_provider)
+        if executor is None:
+            raise ValueError(f"Unsupported provider: {db_provider}")
+        return executor
 
     def list_tables(self, connection_id: str) -> List[str]:
         """
-        List all tables in the connected database.
+        List all tables (collections for MongoDB) in the connected database.
         """
         try:
-            conn_data = self._get_connection_data(connection_id)
-            db_provider = conn_data.get('db_provider_name', conn_data['db_name'])
-            print(f"Debug: db_provider = {db_provider}")
-
-            if db_provider == "supabase":
-                query = "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'"
-                print(f"Debug: Executing query: {query}")
-                result = self.execute_sql_query(connection_id, query)
-                print(f"Debug: Query result: {result}")
-                
-                if isinstance(result, list):
-                    tables = [row.get('table_name') for row in result if 'table_name' in row]
-                    print(f"Debug: Extracted tables: {tables}")
-                    return tables
-                elif isinstance(result, dict) and 'error' in result:
-                    print(f"Debug: Error in query: {result['error']}")
-                    return []
-                return []
-            
-            print(f"Debug: Unsupported provider: {db_provider}")
-            return []
+            return schema_catalog.list_tables(connection_id)
         except Exception as e:
-            print(f"Debug: Exception in list_tables: {str(e)}")
+            logger.warning("Exception in list_tables: %s", e)
             return []
 
-    def get_table_schema(self, connection_id: str, table_name: str) -> Dict[str, Any]:
+    def get_table_schema(self, connection_id: str, table_name: str) -> Any:
         """
-        Get the schema for a specific table.
+        Get the schema for a specific table from the schema catalog.
         """
-        query = f"""
-            SELECT column_name, data_type, is_nullable 
-            FROM information_schema.columns 
-            WHERE table_schema = 'public' AND table_name = '{table_name}'
-        """
-        return self.execute_sql_query(connection_id, query)
+        try:
+            table = schema_catalog.get_table(connection_id, table_name)
+        except Exception as e:
+            return {"error": f"Failed to read schema: {str(e)}"}
+
+        if table is None:
+            return {"error": f"Table {table_name} not found"}
+        return table["columns"]
 
     def execute_sql_query(self, connection_id: str, query: str) -> Any:
         """
-        Execute a raw SQL query using SQLAlchemy.
+        Execute a raw SQL query on the connection's pooled SQL executor.
+
+        Rows are streamed from a server-side cursor and capped by
+        MAX_RESULT_ROWS / MAX_RESULT_BYTES, and the database aborts it after
+        the connection's query_timeout_ms. The result is columnar:
+        {"columns": [...], "rows": [[...], ...], "row_count": n, "truncated": bool}
+        plus a planner estimate of the total rows when truncated. With the
+        cost guard on, statements with an expensive plan are limited or
+        rejected before they run.
         """
         conn_data = self._get_connection_data(connection_id)
-        credentials = conn_data['credentials']
         db_provider = conn_data.get('db_provider_name', conn_data['db_name'])
-        
-        if db_provider == "supabase":
+        if db_provider == "mongodb":
+            return {"error": "MongoDB connections are queried with run_aggregation"}
+
+        try:
+            executor = self._get_executor(conn_data)
+        except ValueError as e:
+            return {"error": str(e)}
+
+        cache_key = query_cache.key(connection_id, query)
+        if cache_key:
+            cached = query_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        statement = query
+        if cost_guard.enabled:
             try:
-                from sqlalchemy import create_engine, text
-                
-                # Create engine with timeout settings
-                engine = create_engine(
-                    credentials["connection_string"],
-                    pool_timeout=30,
-                    pool_recycle=3600,
-                    connect_args={"connect_timeout": 30}
-                )
-                with engine.connect() as connection:
-                    result = connection.execute(text(query))
-                    rows = result.fetchall()
-                    
-                    # Convert to list of dictionaries
-                    columns = result.keys()
-                    return [dict(zip(columns, row)) for row in rows]
-                    
+                statement, rejection = cost_guard.check(executor, connection_id, conn_data['credentials'], query)
             except Exception as e:
-                return {"error": f"Failed to execute SQL via SQLAlchemy: {str(e)}"}
+                return {"error": f"Failed to check query cost: {str(e)}"}
+            if rejection:
+                return rejection
 
-        return {"error": "Unsupported provider"}
+        try:
+            result = executor.execute(
+                connection_id, conn_data['credentials'], statement, timeout_ms=query_timeout(conn_data)
+            )
+        except Exception as e:
+            return {"error": f"Failed to execute query: {str(e)}"}
+        finally:
+            if not cache_key:
+                # The statement may have changed data behind cached results,
+                # even when reading its outcome failed
+                query_cache.invalidate(connection_id)
+
+        if cache_key:
+            query_cache.put(cache_key, result)
+        return result
 
-    def get_configured_tools(self, connection_id: str):
+    def run_aggregation(self, connection_id: str, collection: str, pipeline: Any) -> Any:
+        """
+        Run a read-only MongoDB aggregation pipeline, returning the same
+        bounded columnar result as execute_sql_query.
+        """
+        conn_data = self._get_connection_data(connection_id)
+        db_provider = conn_data.get('db_provider_name', conn_data['db_name'])
+        if db_provider != "mongodb":
+            return {"error": "run_aggregation is only available for MongoDB connections"}
+
+        try:
+            if isinstance(pipeline, str):
+                pipeline = json.loads(pipeline)
+            return self._get_executor(conn_data).execute(
+                connection_id,
+                conn_data['credentials'],
+                {"collection": collection, "pipeline": pipeline},
+                timeout_ms=query_timeout(conn_data)
+            )
+        except Exception as e:
+            return {"error": f"Failed to run aggregation: {str(e)}"}
+
+    @staticmethod
+    def format_result(result: Any) -> str:
+        """Compact text form of a tool result for the LLM context"""
+        if isinstance(result, str):
+            return result
+        with span("result_serialization"):
+            return json.dumps(result, default=str, separators=(",", ":"))
+
+    def get_configured_tools(self, connection_id: str, db_provider: str):
         """
         Returns a list of LangChain tools configured for the specific connection.
         """
-        # from langchain.tools import StructuredTool # Deprecated/Moved
         from langchain_core.tools import StructuredTool
-        from pydantic import BaseModel, Field
 
-        # Define input models for tools (optional, but good for description)
-        
         def list_tables_wrapper() -> str:
             """List all tables in the database."""
-            return str(self.list_tables(connection_id))
+            return self.format_result(self.list_tables(connection_id))
 
         def get_schema_wrapper(table_name: str) -> str:
             """Get definition/schema of a specific table."""
-            return str(self.get_table_schema(connection_id, table_name))
+            return self.format_result(self.get_table_schema(connection_id, table_name))
 
         def execute_sql_wrapper(query: str) -> str:
             """Execute a SQL query against the database. Use this to query data."""
-            return str(self.execute_sql_query(connection_id, query))
+            return self.format_result(self.execute_sql_query(connection_id, query))
+
+        def run_aggregation_wrapper(collection: str, pipeline: str) -> str:
+            """Run a MongoDB aggregation pipeline (JSON array of stages) on a collection."""
+            return self.format_result(self.run_aggregation(connection_id, collection, pipeline))
+
+        is_mongodb = db_provider == "mongodb"
 
         return [
             StructuredTool.from_function(
                 func=list_tables_wrapper,
                 name="list_tables",
-                description="List all available tables in the database."
+                description="List all available collections in the database." if is_mongodb
+                    else "List all available tables in the database."
             ),
             StructuredTool.from_function(
                 func=get_schema_wrapper,
                 name="get_table_schema",
-                description="Get the schema (columns, types) of a specific table."
+                description="Get the fields (inferred from sample documents) of a specific collection." if is_mongodb
+                    else "Get the schema (columns, types) of a specific table."
             ),
             StructuredTool.from_function(
+                func=run_aggregation_wrapper,
+                name="run_aggregation",
+                description="Run a read-only MongoDB aggregation pipeline, given as a JSON array of stages, on a collection. Always verify collection names with list_tables first."
+            ) if is_mongodb else StructuredTool.from_function(
                 func=execute_sql_wrapper,
                 name="execute_sql_query",
-                description="Execute a RAW SQL query to fetch data. Always verify table names with list_tables first."
+                description="Execute a RAW SQL query to fetch data. Always verify table names with list_tables first. Queries with an expensive plan may be rejected with a reason; rewrite them and try again."
             )
         ]
 
@@ -0,0 +1,263 @@
+"""
+Local stand-ins for the services the backend talks to, so the app can be
+benchmarked in-process and offline:
+
+- FakeSupabase: the `connections` table and `auth.get_user`
+- ScriptedLLM: a deterministic chat model that answers by calling
+  execute_sql_query once, then phrasing the result
+- FakeChatGroq: replaces langchain_groq.ChatGroq, so the app builds its
+  tools and model as usual but gets a ScriptedLLM back
+- SqliteQueryExecutor: a query executor for SQLite target databases
+"""
+import asyncio
+import copy
+import hashlib
+import itertools
+import random
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from app.services.query_executors import SqlQueryExecutor
+
+
+class FakeQuery:
+    """The subset of the postgrest query builder the backend uses"""
+
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.operation = "select"
+        self.payload = None
+        self.filters = []
+
+    def select(self, *columns):
+        self.operation = "select"
+        return self
+
+    def insert(self, payload: Dict[str, Any]):
+        self.operation = "insert"
+        self.payload = payload
+        return self
+
+    def update(self, payload: Dict[str, Any]):
+        self.operation = "update"
+        self.payload = payload
+        return self
+
+    def eq(self, column: str, value: Any):
+        self.filters.append((column, str(value)))
+        return self
+
+    def execute(self):
+        time.sleep(self.db.latency)
+        with self.db.lock:
+            rows = self.db.tables.setdefault(self.table, [])
+            if self.operation == "insert":
+                row = dict(self.payload, id=next(self.db.ids))
+                rows.append(row)
+                matched = [row]
+            else:
+                matched = [
+                    row for row in rows
+                    if all(str(row.get(column)) == value for column, value in self.filters)
+                ]
+                if self.operation == "update":
+                    for row in matched:
+                        row.update(self.payload)
+            return SimpleNamespace(data=copy.deepcopy(matched))
+
+
+class FakeAuth:
+    def __init__(self, db: "FakeSupabase"):
+        self.db = db
+
+    def get_user(self, access_token: str):
+        import jwt
+
+        time.sleep(self.db.latency)
+        claims = jwt.decode(access_token, options={"verify_signature": False})
+        return SimpleNamespace(user=SimpleNamespace(id=claims["sub"], email=claims.get("email")))
+
+
+class FakeSupabase:
+    """In-memory Supabase client, each call delayed by `latency` seconds"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.auth = FakeAuth(self)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+
+# Questions the scripted LLM knows, with the SQL it answers them with
+SCRIPT = [
+    ("How many orders are there per status?",
+     "SELECT status, COUNT(*) AS orders FROM orders GROUP BY status ORDER BY status"),
+    ("What is the revenue per country?",
+     "SELECT u.country, ROUND(SUM(o.total), 2) AS revenue FROM orders o "
+     "JOIN users u ON u.id = o.user_id GROUP BY u.country ORDER BY revenue DESC"),
+    ("Who are the top customers by spend?",
+     "SELECT u.email, ROUND(SUM(o.total), 2) AS spend FROM orders o "
+     "JOIN users u ON u.id = o.user_id GROUP BY u.id ORDER BY spend DESC LIMIT 10"),
+    ("Show the most recent orders",
+     "SELECT id, user_id, status, total, created_at FROM orders ORDER BY created_at DESC LIMIT 50"),
+]
+
+
+class FakeChatGroq:
+    """Takes ChatGroq's place: binding tools returns the shared `llm`"""
+
+    llm: Optional["ScriptedLLM"] = None
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def bind_tools(self, tools: List[Any]):
+        return self.llm
+
+
+class ScriptedLLM:
+    """
+    Deterministic stand-in for a tool-calling chat model. For a new question
+    it calls execute_sql_query with the scripted SQL, once the result is in
+    it answers. Every call waits `latency` seconds, like a remote model.
+    """
+
+    def __init__(self, latency: float = 0.0, answer_only: bool = False):
+        self.latency = latency
+        self.answer_only = answer_only
+
+    def bind(self, tool_choice: Optional[str] = None, **kwargs):
+        return ScriptedLLM(self.latency, answer_only=tool_choice == "none")
+
+    def _respond(self, messages: List[Any]):
+        from langchain_core.messages import AIMessageChunk
+
+        last_question = max(i for i, message in enumerate(messages) if message.type == "human")
+        tool_results = [message for message in messages[last_question:] if message.type == "tool"]
+        if tool_results or self.answer_only:
+            content = tool_results[-1].content if tool_results else ""
+            return AIMessageChunk(content=f"Here is what I found: {content[:200]}")
+
+        question = messages[last_question].content
+        sql = next((sql for known, sql in SCRIPT if question.startswith(known)), SCRIPT[0][1])
+        call_id = "call_" + hashlib.md5(f"{question}{len(messages)}".encode("utf-8")).hexdigest()[:12]
+        return AIMessageChunk(
+            content="",
+            tool_calls=[{"name": "execute_sql_query", "args": {"query": sql}, "id": call_id}],
+            usage_metadata={"input_tokens": sum(len(str(m.content)) for m in messages) // 4,
+                            "output_tokens": 20, "total_tokens": 0},
+        )
+
+    async def ainvoke(self, messages: List[Any]):
+        await asyncio.sleep(self.latency)
+        return self._respond(messages)
+
+    async def astream(self, messages: List[Any]):
+        await asyncio.sleep(self.latency)
+        response = self._respond(messages)
+        if response.tool_calls:
+            yield response
+            return
+        words = response.content.split(" ")
+        for i in range(0, len(words), 8):
+            yield type(response)(content=" ".join(words[i:i + 8]) + " ")
+
+
+class SqliteQueryExecutor(SqlQueryExecutor):
+    """SQLite target databases, introspected through the SQLite catalog"""
+
+    def __init__(self):
+        super().__init__("sqlite", "sqlite")
+
+    def _canceller(self, connection_id, credentials, connection):
+        return connection.connection.dbapi_connection.interrupt
+
+    def fingerprints(self, connection_id, credentials):
+        from sqlalchemy import text
+
+        with self.handle(connection_id, credentials).connect() as connection:
+            rows = connection.execute(text(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            ))
+            return {name: hashlib.md5((sql or "").encode("utf-8")).hexdigest() for name, sql in rows}
+
+    def introspect(self, connection_id, credentials, fingerprints, table_names=None):
+        from sqlalchemy import text
+
+        tables = {}
+        with self.handle(connection_id, credentials).connect() as connection:
+            for name in (table_names if table_names is not None else list(fingerprints)):
+                references = {}
+                for row in connection.execute(text(f'PRAGMA foreign_key_list("{name}")')).mappings():
+                    references.setdefault(row["from"], []).append(f"{row['table']}.{row['to']}")
+                tables[name] = {
+                    "fingerprint": fingerprints[name],
+                    "columns": [
+                        {
+                            "column_name": row["name"],
+                            "data_type": (row["type"] or "").lower(),
+                            "is_nullable": "NO" if row["notnull"] or row["pk"] else "YES",
+                            "primary_key": bool(row["pk"]),
+                            "references": references.get(row["name"], []),
+                        }
+                        for row in connection.execute(text(f'PRAGMA table_info("{name}")')).mappings()
+                    ],
+                }
+        return tables
+
+
+def seed_target_database(path: str, users: int = 1000, orders: int = 20000, seed: int = 7):
+    """Create a small shop schema with reproducible data"""
+    rng = random.Random(seed)
+    countries = ["US", "DE", "FR", "IN", "BR", "JP", "GB", "CA"]
+    statuses = ["pending", "paid", "shipped", "delivered", "cancelled"]
+
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        DROP TABLE IF EXISTS orders;
+        DROP TABLE IF EXISTS users;
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY,
+            email TEXT NOT NULL,
+            country TEXT NOT NULL
+        );
+        CREATE TABLE orders (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            status TEXT NOT NULL,
+            total REAL NOT NULL,
+            created_at TEXT NOT NULL
+        );
+    """)
+    connection.executemany(
+        "INSERT INTO users (id, email, country) VALUES (?, ?, ?)",
+        [(i, f"user{i}@example.com", rng.choice(countries)) for i in range(1, users + 1)]
+    )
+    connection.executemany(
+        "INSERT INTO orders (id, user_id, status, total, created_at) VALUES (?, ?, ?, ?, ?)",
+        [
+            (i, rng.randint(1, users), rng.choice(statuses), round(rng.uniform(5, 500), 2),
+             f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+            for i in range(1, orders + 1)
+        ]
+    )
+    connection.commit()
+    connection.close()
+
+
+def connection_record(path: str, user_id: str) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "db_name": "bench",
+        "db_provider_name": "sqlite",
+        "credentials": {"connection_string": f"sqlite:///{path}?check_same_thread=false"},
+        "connected": False,
+    }
@@ -0,0 +1,116 @@
+"""
+Import-time profile of the app, i.e. the cold start of a worker.
+
+Imports `main` in a fresh interpreter under `python -X importtime`, reports
+the total and the slowest modules, and fails if a dependency that should
+only load on first use (an LLM client, a database driver, Supabase, pyarrow)
+is imported at startup, or if the import takes longer than --max-seconds.
+
+Usage, from the backend directory:
+
+    python -m benchmarks.imports
+    python -m benchmarks.imports --max-seconds 1.5 --top 20 --json imports.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+# Top-level packages that must not be imported by `import main`
+LAZY_PACKAGES = (
+    "langchain",
+    "langchain_core",
+    "langchain_groq",
+    "langchain_openai",
+    "langgraph",
+    "groq",
+    "openai",
+    "supabase",
+    "postgrest",
+    "pymongo",
+    "psycopg2",
+    "mysql",
+    "pymysql",
+    "sqlalchemy",
+    "pyarrow",
+)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile() -> List[Dict[str, Any]]:
+    """Modules imported by `import main`, with their own and cumulative microseconds"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{result.stderr}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|", 2)
+        modules.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_us": int(own),
+            "cumulative_us": int(cumulative),
+        })
+    return modules
+
+
+def report(modules: List[Dict[str, Any]], top: int) -> Dict[str, Any]:
+    total_us = sum(module["self_us"] for module in modules)
+    lazy = sorted({
+        module["module"] for module in modules
+        if module["module"].split(".")[0] in LAZY_PACKAGES
+    })
+    slowest = sorted(modules, key=lambda module: module["cumulative_us"], reverse=True)
+    # The app modules and the packages they pull in, not every submodule
+    top_level = [module for module in slowest if module["depth"] <= 2][:top]
+    return {
+        "total_seconds": total_us / 1e6,
+        "modules": len(modules),
+        "slowest": top_level,
+        "unexpected": lazy,
+    }
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"import main: {result['total_seconds']:.3f}s, {result['modules']} modules")
+    print(f"{'module':48} {'cumulative':>12} {'self':>10}")
+    for module in result["slowest"]:
+        print(f"{module['module']:48} {module['cumulative_us'] / 1000:10.1f}ms {module['self_us'] / 1000:8.1f}ms")
+    if result["unexpected"]:
+        print("Imported at startup but should load on first use:")
+        for name in result["unexpected"]:
+            print(f"  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="fail if importing the app takes longer than this")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest modules to list")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    result = report(profile(), args.top)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failed = bool(result["unexpected"])
+    if args.max_seconds is not None and result["total_seconds"] > args.max_seconds:
+        print(f"Import took {result['total_seconds']:.3f}s, over the {args.max_seconds:.3f}s budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Offline benchmark of the backend's hot paths.
+
+Runs the FastAPI app in-process against local stand-ins (see fakes.py):
+an in-memory Supabase, a scripted LLM and SQLite target databases. Then
+drives the selected endpoints at the given concurrency and reports latency
+percentiles, throughput, time per phase (from the app's own metrics) and
+peak memory. Results are deterministic apart from timing, so a saved
+--json report can serve as the --baseline of a later run.
+
+Usage, from the backend directory:
+
+    python -m benchmarks.run --concurrency 16 --requests 400
+    python -m benchmarks.run --scenarios chat --llm-latency 0.2 --json bench.json
+    python -m benchmarks.run --baseline bench.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SCENARIOS = ("connections", "connect", "chat", "chat_stream")
+BENCH_JWT_SECRET = "benchmark-secret-not-for-production-use"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at once")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per scenario")
+    parser.add_argument("--users", type=int, default=8, help="distinct authenticated users")
+    parser.add_argument("--connections", type=int, default=4, help="target databases")
+    parser.add_argument("--rows", type=int, default=20000, help="orders per target database")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per scripted LLM call")
+    parser.add_argument("--supabase-latency", type=float, default=0.01, help="seconds per Supabase call")
+    parser.add_argument("--auth", choices=("local", "remote"), default="local",
+                        help="verify tokens locally (HS256) or through the fake auth server")
+    parser.add_argument("--unique-questions", action="store_true",
+                        help="make every question distinct, so the answer cache never hits")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="track peak Python heap per scenario (slows the run down)")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="compare with a previous --json report")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative p95/throughput regression against the baseline")
+    return parser.parse_args(argv)
+
+
+def setup(args, workdir: str) -> Dict[str, Any]:
+    """Point the app at the local stand-ins and return the app and fixtures"""
+    os.environ["SESSION_STORE_PATH"] = os.path.join(workdir, "sessions.sqlite3")
+    os.environ["CONVERSATION_STORE_PATH"] = os.path.join(workdir, "conversations.sqlite3")
+    os.environ["JOB_STORE_PATH"] = os.path.join(workdir, "jobs.sqlite3")
+    os.environ["JOB_SPOOL_DIR"] = os.path.join(workdir, "jobs")
+    os.environ.pop("SCHEMA_CATALOG_DIR", None)
+
+    import jwt
+    import langchain_groq
+    import main
+    from app.services import db_connect
+    from app.services.auth_service import token_verifier
+    from app.services.query_executors import executors
+    from benchmarks.fakes import (
+        FakeChatGroq, FakeSupabase, ScriptedLLM, SqliteQueryExecutor, connection_record, seed_target_database
+    )
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    supabase = FakeSupabase(latency=args.supabase_latency)
+    # The fake's blocking queries serve the async client's callers too, they
+    # are run in the threadpool like the sync client's
+    db_connect._client = supabase
+    db_connect._async_client = supabase
+
+    token_verifier.jwt_secret = BENCH_JWT_SECRET if args.auth == "local" else None
+    token_verifier.jwks_url = None
+
+    executors["sqlite"] = SqliteQueryExecutor()
+    # Only the model is faked: the app still builds its tools and binds them
+    FakeChatGroq.llm = ScriptedLLM(latency=args.llm_latency)
+    langchain_groq.ChatGroq = FakeChatGroq
+    os.environ.setdefault("GROQ_API_KEY", "benchmark-not-a-key")
+
+    users = [f"00000000-0000-0000-0000-{i:012d}" for i in range(args.users)]
+    tokens = [
+        jwt.encode(
+            {"sub": user, "email": f"{i}@bench.local", "aud": "authenticated", "exp": int(time.time()) + 86400},
+            BENCH_JWT_SECRET,
+            algorithm="HS256",
+        )
+        for i, user in enumerate(users)
+    ]
+
+    # Every user has a connection to every target database. Connection k
+    # belongs to user k % len(users), like the token of request k, so chats
+    # always come from the connection's owner.
+    connection_ids = []
+    for i in range(args.connections):
+        path = os.path.join(workdir, f"target_{i}.sqlite3")
+        seed_target_database(path, orders=args.rows, seed=i)
+        for user in users:
+            record = supabase.table("connections").insert(connection_record(path, user)).execute()
+            connection_ids.append(str(record.data[0]["id"]))
+
+    return {"app": main.app, "tokens": tokens, "connection_ids": connection_ids}
+
+
+def build_requests(scenario: str, fixtures: Dict[str, Any], unique_questions: bool) -> Callable[[int], Dict[str, Any]]:
+    """Request number -> keyword arguments for httpx's client.request()"""
+    from benchmarks.fakes import SCRIPT
+
+    tokens = fixtures["tokens"]
+    connection_ids = fixtures["connection_ids"]
+
+    def headers(i: int) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+
+    if scenario == "connections":
+        return lambda i: {"method": "GET", "url": "/api/database/connections", "headers": headers(i)}
+    if scenario == "connect":
+        return lambda i: {"method": "POST", "url": f"/api/database/connect/{connection_ids[i % len(connection_ids)]}"}
+
+    url = "/api/chat" if scenario == "chat" else "/api/chat/stream"
+
+    def chat_request(i: int) -> Dict[str, Any]:
+        question = SCRIPT[i % len(SCRIPT)][0]
+        if unique_questions:
+            question = f"{question} (request {i})"
+        return {
+            "method": "POST",
+            "url": url,
+            "headers": headers(i),
+            "json": {"message": question, "connection_id": connection_ids[i % len(connection_ids)]},
+        }
+    return chat_request
+
+
+async def drive(client, make_request, total: int, concurrency: int, offset: int = 0) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    counter = iter(range(offset, offset + total))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await client.request(**make_request(i))
+                if response.status_code >= 400 or '"type": "error"' in response.text:
+                    key = f"HTTP {response.status_code}"
+                    errors[key] = errors.get(key, 0) + 1
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"latencies": latencies, "errors": errors, "elapsed": time.perf_counter() - started}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def metric_deltas(before: Dict, after: Dict) -> Dict:
+    deltas = {}
+    for key, value in after.items():
+        previous = before.get(key)
+        if isinstance(value, tuple):
+            previous = previous or (0.0, 0)
+            if value[1] > previous[1]:
+                deltas[key] = (value[0] - previous[0], value[1] - previous[1])
+        elif value > (previous or 0):
+            deltas[key] = value - (previous or 0)
+    return deltas
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def watch_loop_lag(lags: List[float], interval: float = 0.005):
+    """
+    Record how late the event loop wakes up from short sleeps. Anything the
+    app blocks the loop with (a slow import, a synchronous call) shows up
+    here even when the request latencies look fine.
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run_scenario(client, scenario: str, fixtures: Dict[str, Any], args) -> Dict[str, Any]:
+    from app.services.metrics import phase_seconds, cache_requests_total
+
+    make_request = build_requests(scenario, fixtures, args.unique_questions)
+    if args.warmup:
+        await drive(client, make_request, args.warmup, min(args.concurrency, args.warmup), offset=10 ** 6)
+
+    phases_before = phase_seconds.snapshot()
+    caches_before = cache_requests_total.snapshot()
+    if args.tracemalloc:
+        tracemalloc.start()
+    lags: List[float] = []
+    watcher = asyncio.ensure_future(watch_loop_lag(lags))
+    try:
+        run = await drive(client, make_request, args.requests, args.concurrency)
+    finally:
+        watcher.cancel()
+    heap_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    latencies = run["latencies"]
+    phases = {
+        labels[0]: {"total_s": round(total, 4), "count": count, "mean_ms": round(total / count * 1000, 3)}
+        for labels, (total, count) in sorted(metric_deltas(phases_before, phase_seconds.snapshot()).items())
+    }
+    caches = {
+        f"{labels[0]}_{labels[1]}": int(value)
+        for labels, value in sorted(metric_deltas(caches_before, cache_requests_total.snapshot()).items())
+    }
+    return {
+        "requests": len(latencies),
+        "errors": run["errors"],
+        "concurrency": args.concurrency,
+        "throughput_rps": round(len(latencies) / run["elapsed"], 2) if run["elapsed"] else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(max(latencies, default=0) * 1000, 2),
+        },
+        "loop_lag_ms": {
+            "p99": round(percentile(lags, 0.99) * 1000, 2),
+            "max": round(max(lags, default=0) * 1000, 2),
+        },
+        "phases": phases,
+        "caches": caches,
+        "peak_heap_mb": round(heap_peak, 2) if heap_peak is not None else None,
+        "peak_rss_mb": round(peak_rss_mb(), 2),
+    }
+
+
+async def wait_for_warmup(connection_ids: List[str], timeout: float = 60):
+    from app.services.warmup import warmup_manager
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        states = [(warmup_manager.status(cid) or {}).get("state") for cid in connection_ids]
+        if all(state in ("ready", "failed") for state in states):
+            return
+        await asyncio.sleep(0.05)
+
+
+async def run_all(args, fixtures: Dict[str, Any]) -> Dict[str, Any]:
+    import httpx
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    transport = httpx.ASGITransport(app=fixtures["app"])
+    app = fixtures["app"]
+    # The app's startup (e.g. preloading LangChain) and shutdown, as under uvicorn
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            # Chats need connected, warmed-up connections
+            for connection_id in fixtures["connection_ids"]:
+                await client.post(f"/api/database/connect/{connection_id}")
+            await wait_for_warmup(fixtures["connection_ids"])
+
+            results = {}
+            for scenario in scenarios:
+                results[scenario] = await run_scenario(client, scenario, fixtures, args)
+    return results
+
+
+def print_report(results: Dict[str, Any]):
+    for scenario, result in results.items():
+        latency = result["latency_ms"]
+        print(f"\n== {scenario}: {result['requests']} requests at concurrency {result['concurrency']}")
+        print(f"   throughput {result['throughput_rps']} req/s | p50 {latency['p50']} ms | "
+              f"p95 {latency['p95']} ms | p99 {latency['p99']} ms | max {latency['max']} ms")
+        if result["errors"]:
+            print(f"   errors: {result['errors']}")
+        print(f"   event loop lag p99 {result['loop_lag_ms']['p99']} ms | max {result['loop_lag_ms']['max']} ms")
+        memory = f"peak RSS {result['peak_rss_mb']} MB"
+        if result["peak_heap_mb"] is not None:
+            memory += f" | peak heap {result['peak_heap_mb']} MB"
+        print(f"   {memory}")
+        if result["caches"]:
+            print(f"   caches: {', '.join(f'{k}={v}' for k, v in result['caches'].items())}")
+        for phase, stats in sorted(result["phases"].items(), key=lambda item: -item[1]["total_s"]):
+            print(f"   {phase:<28} {stats['count']:>7} x {stats['mean_ms']:>9.3f} ms = {stats['total_s']:>8.3f} s")
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of p95 latency or throughput beyond `tolerance`"""
+    regressions = []
+    for scenario, result in results.items():
+        previous = baseline.get(scenario)
+        if not previous:
+            continue
+        p95, previous_p95 = result["latency_ms"]["p95"], previous["latency_ms"]["p95"]
+        if previous_p95 and p95 > previous_p95 * (1 + tolerance):
+            regressions.append(f"{scenario}: p95 {p95} ms vs {previous_p95} ms")
+        rps, previous_rps = result["throughput_rps"], previous["throughput_rps"]
+        if previous_rps and rps < previous_rps * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {rps} req/s vs {previous_rps} req/s")
+    return regressions
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="dbcopilot-bench-") as workdir:
+        fixtures = setup(args, workdir)
+        results = asyncio.run(run_all(args, fixtures))
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
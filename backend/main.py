@@ -1,10 +1,41 @@
+import asyncio
+import logging
+import os
+import threading
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import database, auth_routes, chat
+from starlette.concurrency import run_in_threadpool
+from app.routers import database, auth_routes, chat, jobs
+from app.services.engine_registry import engine_registry
+from app.services.db_executor import db_executor
+from app.services.job_queue import job_queue
+from app.services.conversation_store import conversation_store
+from app.services.admission import AdmissionRejected
+from app.services.metrics import registry
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# DEBUG logs every agent step; keep it off in production, it sits on the hot path
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between housekeeping runs (closing idle engines, purging expired state)
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "60"))
+
+# Blocking housekeeping tasks, run in the threadpool every MAINTENANCE_INTERVAL
+MAINTENANCE_TASKS = [
+    engine_registry.evict_idle,
+    conversation_store.purge_expired,
+    job_queue.recover,
+    job_queue.cleanup,
+]
+
 app = FastAPI(title="Database Copilot API", version="1.0.0")
 
 # CORS middleware for frontend communication
@@ -20,6 +51,49 @@ app.add_middleware(
 app.include_router(database.router)
 app.include_router(auth_routes.router)
 app.include_router(chat.router)
+app.include_router(jobs.router)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.on_event("startup")
+def preload_langchain():
+    # In the background: the worker takes requests at once, and the first
+    # chat no longer stalls the event loop importing LangChain
+    threading.Thread(target=chat.preload_langchain, name="preload-langchain", daemon=True).start()
+
+async def maintain():
+    # First run at startup, e.g. to fail jobs an earlier process left behind
+    while True:
+        for task in MAINTENANCE_TASKS:
+            try:
+                await run_in_threadpool(task)
+            except Exception:
+                logger.exception("Maintenance task %s failed", task.__qualname__)
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+
+@app.on_event("startup")
+def start_maintenance():
+    app.state.maintenance = asyncio.ensure_future(maintain())
+
+@app.on_event("shutdown")
+def dispose_engines():
+    maintenance = getattr(app.state, "maintenance", None)
+    if maintenance:
+        maintenance.cancel()
+    job_queue.shutdown()
+    db_executor.shutdown()
+    engine_registry.dispose_all()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Counters and latency histograms in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
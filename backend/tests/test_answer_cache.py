@@ -0,0 +1,55 @@
+from app.services.answer_cache import AnswerCache
+
+CONNECTION = "1"
+FINGERPRINT = "schema-v1"
+
+
+def cache_with(question: str, query: str) -> AnswerCache:
+    cache = AnswerCache()
+    cache.remember(CONNECTION, FINGERPRINT, question, [
+        {"name": "execute_sql_query", "args": {"query": query}, "result": {"rows": [[3]]}},
+    ])
+    return cache
+
+
+def test_reworded_question_reuses_the_query():
+    cache = cache_with("How many orders were cancelled?", "SELECT count(*) FROM orders WHERE status = 'cancelled'")
+
+    hit = cache.lookup(CONNECTION, FINGERPRINT, "how many cancelled orders are there")
+
+    assert hit == {
+        "name": "execute_sql_query",
+        "args": {"query": "SELECT count(*) FROM orders WHERE status = 'cancelled'"},
+    }
+
+
+def test_negated_question_does_not_reuse_the_query():
+    cache = cache_with("how many orders were cancelled", "SELECT count(*) FROM orders WHERE status = 'cancelled'")
+
+    assert cache.lookup(CONNECTION, FINGERPRINT, "how many orders were not cancelled") is None
+    assert cache.lookup(CONNECTION, FINGERPRINT, "how many orders weren't cancelled") is None
+
+
+def test_changed_comparison_or_ordering_does_not_reuse_the_query():
+    cache = cache_with("customers with orders after march", "SELECT ... WHERE ordered_at > '2024-03-01'")
+
+    assert cache.lookup(CONNECTION, FINGERPRINT, "customers with orders before march") is None
+
+    cache = cache_with("most expensive product", "SELECT name FROM products ORDER BY price DESC LIMIT 1")
+
+    assert cache.lookup(CONNECTION, FINGERPRINT, "least expensive product") is None
+
+
+def test_changed_entity_does_not_reuse_the_query():
+    cache = cache_with("total sales in germany", "SELECT sum(amount) FROM sales WHERE country = 'DE'")
+
+    assert cache.lookup(CONNECTION, FINGERPRINT, "total sales in france") is None
+
+
+def test_changed_period_does_not_reuse_the_query():
+    cache = cache_with(
+        "revenue last year",
+        "SELECT sum(amount) FROM sales WHERE sold_at >= date_trunc('year', now()) - interval '1 year'",
+    )
+
+    assert cache.lookup(CONNECTION, FINGERPRINT, "revenue last month") is None
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from app.routers.chat import _release_once
+from app.routers.responses import ReleasingStreamingResponse
+from app.services.admission import chat_limiter
+
+USER = "stream-user"
+
+
+async def never_started():
+    yield b"{}\n"
+
+
+async def disconnected_send(message):
+    raise OSError("client disconnected")
+
+
+async def receive():
+    return {"type": "http.disconnect"}
+
+
+def test_slot_is_released_when_the_client_is_gone_before_the_first_chunk():
+    chat_limiter.acquire(USER)
+    response = ReleasingStreamingResponse(never_started(), _release_once(USER))
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    with pytest.raises(Exception):
+        asyncio.run(response(scope, receive, disconnected_send))
+
+    assert chat_limiter.in_flight(USER) == 0
+
+
+def test_release_is_idempotent():
+    chat_limiter.acquire(USER)
+    chat_limiter.acquire(USER)
+    release = _release_once(USER)
+
+    release()
+    release()
+
+    assert chat_limiter.in_flight(USER) == 1
+    chat_limiter.release(USER)
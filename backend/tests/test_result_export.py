@@ -0,0 +1,27 @@
+from decimal import Decimal
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from app.services.result_export import ArrowWriter
+
+
+def write(batches):
+    writer = ArrowWriter()
+    data = writer.header(["value"])
+    for rows in batches:
+        data += writer.batch(rows)
+    data += writer.footer()
+    return pa.ipc.open_stream(data).read_all()
+
+
+def test_later_float_in_an_integer_column_fails_instead_of_truncating():
+    with pytest.raises(ValueError, match="value"):
+        write([[(1,), (2,)], [(2.5,)]])
+
+
+def test_decimals_may_grow_after_the_first_batch():
+    table = write([[(Decimal("1.25"),)], [(Decimal("123456789.50"),)]])
+
+    assert table.column("value").to_pylist() == [Decimal("1.25"), Decimal("123456789.50")]
@@ -1,6 +1,6 @@
 "use client";
 import { useState, useRef, useEffect } from "react";
-import { sendChatMessage } from "../services/api";
+import { streamChatMessage } from "../services/api";
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
 import rehypeHighlight from 'rehype-highlight';
@@ -29,6 +29,12 @@ export const ChatPage = ({ connectionId }: Props) => {
     }
   ]);
   const [isLoading, setIsLoading] = useState(false);
+  // Server-side conversation, so follow-up questions keep their context
+  const [conversationId, setConversationId] = useState<string | undefined>(undefined);
+
+  useEffect(() => {
+    setConversationId(undefined);
+  }, [connectionId]);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   const scrollToBottom = () => {
@@ -54,18 +60,46 @@ export const ChatPage = ({ connectionId }: Props) => {
     setMessage("");
     setIsLoading(true);
 
+    const aiMessageId = (Date.now() + 1).toString();
+    const updateAiMessage = (update: (text: string) => string) => {
+      setMessages(prev => prev.map(msg =>
+        msg.id === aiMessageId ? { ...msg, text: update(msg.text) } : msg
+      ));
+    };
+
+    setMessages(prev => [...prev, {
+      id: aiMessageId,
+      text: "",
+      isUser: false,
+      timestamp: new Date(),
+      isTyping: true
+    }]);
+
     try {
-      const data = await sendChatMessage(currentMessage, connectionId);
-      
-      const aiMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        text: data.response || 'Sorry, I encountered an error processing your request.',
-        isUser: false,
-        timestamp: new Date()
-      };
-      
-      setMessages(prev => [...prev, aiMessage]);
+      // Tokens after a tool call belong to a new LLM turn and replace the status line
+      let replaceOnToken = false;
+
+      await streamChatMessage(currentMessage, connectionId, (event) => {
+        if (event.type === "token") {
+          const startsTurn = replaceOnToken;
+          replaceOnToken = false;
+          updateAiMessage(text => (startsTurn ? "" : text) + event.content);
+        } else if (event.type === "tool_call") {
+          replaceOnToken = true;
+          updateAiMessage(() => `_Running \`${event.name}\`..._`);
+        } else if (event.type === "final") {
+          setConversationId(event.conversation_id);
+          updateAiMessage(() => event.response || 'Sorry, I encountered an error processing your request.');
+        } else if (event.type === "error") {
+          throw new Error(event.detail);
+        }
+      }, conversationId);
+
+      setMessages(prev => prev.map(msg =>
+        msg.id === aiMessageId ? { ...msg, isTyping: false } : msg
+      ));
     } catch (error) {
+      setMessages(prev => prev.filter(msg => msg.id !== aiMessageId));
       const errorMessage: Message = {
         id: (Date.now() + 1).toString(),
         text: 'Sorry, I encountered an error processing your request. Please try again.',
@@ -102,7 +136,7 @@ export const ChatPage = ({ connectionId }: Props) => {
         {/* Messages Area */}
         <div className="flex-1 bg-white/5 backdrop-blur-lg rounded-2xl border border-white/10 p-6 mb-6 overflow-hidden flex flex-col">
           <div className="flex-1 overflow-y-auto space-y-6 pr-2">
-            {messages.map((msg) => (
+            {messages.filter(msg => msg.text || !msg.isTyping).map((msg) => (
               <div key={msg.id} className={`flex ${msg.isUser ? 'justify-end' : 'justify-start'} animate-in slide-in-from-bottom duration-300`}>
                 <div className={`flex items-start space-x-3 max-w-2xl ${
                   msg.isUser ? 'flex-row-reverse space-x-reverse' : ''
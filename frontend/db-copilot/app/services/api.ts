@@ -81,35 +81,82 @@ export const login = async (credentials: any) => {
   return response.json();
 };
 
-export const sendChatMessage = async (message: string, connectionId: string) => {
+export const sendChatMessage = async (message: string, connectionId: string, conversationId?: string) => {
   return authenticatedFetch("/api/chat", {
     method: "POST",
     body: JSON.stringify({
       message,
       connection_id: connectionId,
+      conversation_id: conversationId,
       model_provider: "groq"
     }),
   });
 };
 
-export const getConnections = async () => {
-  return authenticatedFetch("/api/database/connections");
-};
+export type ChatStreamEvent =
+  | { type: "token"; content: string }
+  | { type: "tool_call"; id: string; name: string; args: Record<string, any> }
+  | { type: "tool_result"; id: string; name: string; result: any }
+  | { type: "final"; response: string; tool_calls: any[]; conversation_id: string; stopped?: string }
+  | { type: "error"; detail: string };
+
+export const streamChatMessage = async (
+  message: string,
+  connectionId: string,
+  onEvent: (event: ChatStreamEvent) => void,
+  conversationId?: string
+) => {
+  const accessToken = localStorage.getItem('access_token');
 
-export const disconnectDatabase = async () => {
-  const response = await fetch(`${API_BASE_URL}/api/database/disconnect`, {
-    method: "post",
+  const response = await fetch(`${API_BASE_URL}/api/chat/stream`, {
+    method: "POST",
     headers: {
       "Content-Type": "application/json",
+      ...(accessToken && { "Authorization": `Bearer ${accessToken}` }),
     },
+    body: JSON.stringify({
+      message,
+      connection_id: connectionId,
+      conversation_id: conversationId,
+      model_provider: "groq"
+    }),
   });
 
-  if (!response.ok) {
+  if (!response.ok || !response.body) {
     const error = await response.json();
-    throw new Error(error.detail || "Disconnect failed");
+    throw new Error(error.detail || "Request failed");
   }
 
-  return response.json();
+  // The stream is newline-delimited JSON, one event per line
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop() || "";
+
+    for (const line of lines) {
+      if (line.trim()) onEvent(JSON.parse(line));
+    }
+  }
+
+  if (buffer.trim()) onEvent(JSON.parse(buffer));
+};
+
+export const getConnections = async () => {
+  return authenticatedFetch("/api/database/connections");
+};
+
+export const disconnectDatabase = async (connectionId?: string) => {
+  const query = connectionId ? `?connection_id=${encodeURIComponent(connectionId)}` : "";
+  return authenticatedFetch(`/api/database/disconnect${query}`, {
+    method: "POST",
+  });
 };
 
 export const signout = async (tokens: { access_token: string; refresh_token: string | null }) => {